@@ -0,0 +1,112 @@
+#!/usr/bin/python
+
+"""
+Input pool for the op_eval scripts.
+
+Every input is built once per (shape, dtype, seed) and handed out either as
+a read-only view (ops that do not touch their input) or as a fresh copy (ops
+that write into it). When the pool is given a directory, each input is also
+written there as raw C-order bytes and served back through `np.memmap`, so
+`op_eval.ml` and `op_eval.jl` can map exactly the same data. Set the
+environment variable `OP_EVAL_ARENA` to that directory to share it between
+the three scripts.
+
+File names are `uniform_<dtype>_<d0>x<d1>..._<seed>.bin`.
+
+Inputs also come in memory layouts other than C order, built in memory from
+the C-order data (so with the same values): 'F' (Fortran order), 'strided'
+(every other element of a buffer twice as long in the last axis, so no axis
+is contiguous) and 'misaligned' (C order, one byte off the alignment of the
+dtype). Integer inputs hold values in [1, 100), so that they never divide
+by zero; complex ones get a uniform imaginary part as well.
+"""
+
+import os
+
+import numpy as np
+
+
+def fname(shape, dtype, seed):
+    dims = 'x'.join(map(str, shape))
+    return "uniform_%s_%s_%d.bin" % (np.dtype(dtype).name, dims, seed)
+
+
+layouts = ['C', 'F', 'strided', 'misaligned']
+
+
+def generate(shape, dtype, seed):
+    rs = np.random.RandomState(seed)
+    x = rs.rand(*shape)
+    kind = np.dtype(dtype).kind
+    if kind == 'c':
+        x = x + 1j * rs.rand(*shape)
+    elif kind in 'iu':
+        x = 1 + 99 * x
+    return x.astype(dtype)
+
+
+def relayout(a, layout):
+    """A writable copy of `a` in the given layout."""
+    if layout == 'C':
+        return np.array(a, order='C')
+    if layout == 'F':
+        return np.array(a, order='F')
+    if layout == 'strided':
+        buf = np.empty(a.shape[:-1] + (2 * a.shape[-1],), a.dtype)
+        v = buf[..., ::2]
+    elif layout == 'misaligned':
+        buf = np.empty(a.nbytes + a.itemsize, np.uint8)
+        v = buf[1:a.nbytes + 1].view(a.dtype).reshape(a.shape)
+    else:
+        raise ValueError("unknown layout %s" % layout)
+    v[...] = a
+    return v
+
+
+class Arena(object):
+
+    def __init__(self, path=None):
+        self.path = path
+        self.pool = {}
+        if path is not None and not os.path.exists(path):
+            os.makedirs(path)
+
+    def build(self, shape, dtype, seed):
+        key = (shape, np.dtype(dtype).str, seed)
+        if key in self.pool:
+            return self.pool[key]
+        if self.path is None:
+            a = generate(shape, dtype, seed)
+        else:
+            a = self.mapped(shape, dtype, seed)
+        a.flags.writeable = False
+        self.pool[key] = a
+        return a
+
+    def mapped(self, shape, dtype, seed):
+        f = os.path.join(self.path, fname(shape, dtype, seed))
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if not os.path.exists(f) or os.path.getsize(f) != nbytes:
+            # written aside and renamed, as sweep workers may race on a file
+            tmp = "%s.%d" % (f, os.getpid())
+            m = np.memmap(tmp, dtype=dtype, mode='w+', shape=shape)
+            m[...] = generate(shape, dtype, seed)
+            m.flush()
+            del m
+            os.replace(tmp, f)
+        return np.memmap(f, dtype=dtype, mode='r', shape=shape)
+
+    def get(self, shape, dtype='float32', seed=0, mutable=False, layout='C'):
+        a = self.build(tuple(shape), dtype, seed)
+        if mutable:
+            return relayout(a, layout)
+        if layout == 'C':
+            return a.view(np.ndarray)
+        key = (tuple(shape), np.dtype(dtype).str, seed, layout)
+        if key not in self.pool:
+            self.pool[key] = relayout(a, layout)
+            self.pool[key].flags.writeable = False
+        return self.pool[key]
+
+    def clear(self):
+        self.pool = {}
@@ -0,0 +1,120 @@
+#!/usr/bin/python
+
+"""
+Input sizes placed around the cache boundaries of the host.
+
+`caches()` reads the data and unified caches of the host from
+/sys/devices/system/cpu/cpu*/cache. An op of a given arity and dtype leaves
+a cache level once its working set, the inputs plus the output, no longer
+fits in it; `boundaries` gives those input sizes (in elements) and `grid` a
+log-spaced grid of sizes that is coarse away from the boundaries and dense
+around each of them, up to a few times the last-level cache, where DRAM
+bandwidth takes over.
+
+`python cachegrid.py` prints the caches, the boundaries and a grid as a
+comma-separated list, e.g. for crosspoint.ml.
+"""
+
+import argparse
+import glob
+import math
+import os
+
+import numpy as np
+
+# used where sysfs does not tell: a common L1d / L2 / L3
+default_caches = [(1, 32 << 10), (2, 1 << 20), (3, 32 << 20)]
+
+
+def parse_size(s):
+    s = s.strip().upper()
+    scale = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}.get(s[-1:], 1)
+    return int(s.rstrip('KMG')) * scale
+
+
+def read(d, name):
+    with open(os.path.join(d, name)) as f:
+        return f.read().strip()
+
+
+def caches(root='/sys/devices/system/cpu'):
+    """(level, bytes) of every data or unified cache level, smallest first;
+    shared caches count whole."""
+    sizes = {}
+    for d in glob.glob(os.path.join(root, 'cpu[0-9]*', 'cache',
+            'index[0-9]*')):
+        try:
+            if read(d, 'type') == 'Instruction':
+                continue
+            level = int(read(d, 'level'))
+            size = parse_size(read(d, 'size'))
+        except (IOError, OSError, ValueError):
+            continue
+        sizes[level] = max(sizes.get(level, 0), size)
+    return sorted(sizes.items()) or default_caches
+
+
+def boundaries(dtype='float32', arity=1, out=True):
+    """(level, elements) at which the working set fills each cache level."""
+    per_elem = np.dtype(dtype).itemsize * (arity + int(out))
+    return [(level, size // per_elem) for level, size in caches()]
+
+
+def thin(ns, rtol):
+    """Drop the sizes within rtol of the previous one kept."""
+    kept = []
+    for n in sorted(ns):
+        if not kept or n > kept[-1] * (1 + rtol):
+            kept.append(n)
+    return kept
+
+
+def grid(dtype='float32', arity=1, out=True, lo=10, hi=None, per_decade=3,
+        around=7, width=2., max_bytes=1 << 31, rtol=0.05):
+    """Sizes in elements: `per_decade` points per decade from lo to hi, plus
+    `around` points within a factor `width` of each boundary, for one arity
+    or several (e.g. (1, 2) for a mix of unary and binary ops). hi defaults
+    to 4x the last-level boundary, at most `max_bytes` of working set."""
+    arities = [arity] if np.isscalar(arity) else list(arity)
+    bs = [b for a in arities for _, b in boundaries(dtype, a, out)]
+    per_elem = np.dtype(dtype).itemsize * (max(arities) + int(out))
+    if hi is None:
+        hi = min(4 * max(bs), max_bytes // per_elem)
+    decades = math.log10(hi / float(lo))
+    n = [np.geomspace(lo, hi, max(2, int(round(decades * per_decade)) + 1))]
+    for b in bs:
+        n.append(np.geomspace(b / width, b * width, around))
+    n = np.round(np.concatenate(n)).astype(np.int64)
+    return [int(x) for x in thin(set(n[(n >= lo) & (n <= hi)]), rtol)]
+
+
+def shapes(ndim, dtype='float32', arity=1, out=True, lo=10, **kw):
+    """Hypercube shapes [e] * ndim whose sizes follow `grid`."""
+    edges = [int(round(n ** (1. / ndim)))
+        for n in grid(dtype, arity, out, lo, **kw)]
+    return [[e] * ndim for e in sorted(set(edges)) if e > 0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Print input sizes around the cache boundaries.')
+    parser.add_argument('--dtype', default='float32')
+    parser.add_argument('--arity', default='1',
+        help='input arrays of the op, or several comma-separated (default 1)')
+    parser.add_argument('--no-out', action='store_true',
+        help='the op writes no output of the input size (reductions)')
+    parser.add_argument('--lo', type=int, default=10)
+    parser.add_argument('--hi', type=int, default=None)
+    parser.add_argument('-v', '--verbose', action='store_true',
+        help='also print the caches and boundaries')
+    args = parser.parse_args()
+
+    out = not args.no_out
+    arity = [int(a) for a in args.arity.split(',')]
+    if args.verbose:
+        for a in arity:
+            for (level, size), (_, b) in zip(caches(),
+                    boundaries(args.dtype, a, out)):
+                print("L%d %8d KB  arity %d boundary %d elements" %
+                    (level, size >> 10, a, b))
+    print(','.join(map(str, grid(args.dtype, arity, out, args.lo, args.hi))))
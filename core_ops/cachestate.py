@@ -0,0 +1,112 @@
+#!/usr/bin/python
+
+"""
+Cache state of the inputs of a timed op.
+
+An op repeated on the same buffer finds its inputs in cache, however small
+they are: that is the `warm` state, and the default. In the `cold` state the
+data caches are flushed before every sample by writing through a buffer of
+twice the last-level cache (see cachegrid.py), and in the `tlb` state only
+the TLBs are, by touching one byte of each of many small pages: the data
+stays mostly cached, but every page of the input needs a page walk again.
+Cold samples are single calls, as a second call would find the cache warm;
+`mode(state)` sets this up in clock.py for the cells measured within it.
+
+`python cachestate.py simple_np.npz ...` prints, for every cell measured in
+more than one state, its time in each and the ratio to warm.
+"""
+
+import argparse
+import contextlib
+import mmap
+
+import numpy as np
+
+import cachegrid
+import clock
+import results
+
+states = ['warm', 'cold', 'tlb']
+
+max_bytes = 1 << 30     # cap of the flush buffer, for very large LLCs
+tlb_pages = 16384       # several times the entries of a second-level TLB
+
+
+def stream(nbytes=None):
+    """Flush the data caches: write through twice the last-level cache."""
+    nbytes = nbytes or min(2 * cachegrid.caches()[-1][1], max_bytes)
+    buf = np.ones(nbytes, np.uint8)
+    def evict(): np.add(buf, 1, out=buf)
+    return evict
+
+
+def pages(n=None):
+    """Flush the TLBs: read a byte of each of n pages, kept off huge pages
+    so that each needs its own entry."""
+    n = n or tlb_pages
+    m = mmap.mmap(-1, n * mmap.PAGESIZE)
+    if hasattr(mmap, 'MADV_NOHUGEPAGE'):
+        m.madvise(mmap.MADV_NOHUGEPAGE)
+    buf = np.frombuffer(m, np.uint8)
+    buf[:] = 1
+    # one byte per page, all in the same cache sets: little data evicted
+    lines = buf[::mmap.PAGESIZE]
+    def evict(): lines.sum()
+    return evict
+
+
+_evict = {}
+
+
+def evictor(state):
+    """The flush of a state, built once per process; None when warm."""
+    if state not in states:
+        raise ValueError("unknown cache state %s" % state)
+    if state == 'warm':
+        return None
+    if state not in _evict:
+        _evict[state] = stream() if state == 'cold' else pages()
+    return _evict[state]
+
+
+@contextlib.contextmanager
+def mode(state):
+    saved = clock.evict
+    clock.evict = evictor(state)
+    try:
+        yield
+    finally:
+        clock.evict = saved
+
+
+def gaps(res):
+    """(cell label, {state: mean ms}) of the cells measured in more than one
+    cache state."""
+    cells = {}
+    for i in range(len(res['op'])):
+        k = tuple(res[c][i] for c in ['suite', 'op', 'param', 'variant',
+            'shape', 'dtype', 'layout', 'library'])
+        cells.setdefault(k, {})[res['cache'][i]] = res['mean'][i]
+    return [(k, t) for k, t in cells.items() if len(t) > 1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare the cache states of the same cells.')
+    parser.add_argument('files', nargs='+', help='result files')
+    args = parser.parse_args()
+
+    res = results.load(args.files)
+    rows = gaps(res)
+    print("%-44s %-14s %10s %10s %8s %10s %8s" % ('op', 'shape', 'warm ms',
+        'cold ms', 'cold/w', 'tlb ms', 'tlb/w'))
+    for k, t in rows:
+        suite, op, param, variant, shape = k[:5]
+        name = "%s/%s" % (suite, op) + ("(%s)" % param if param else '') + \
+            ("[%s]" % variant if variant else '')
+        w = t.get('warm', float('nan'))
+        line = "%-44s %-14s %10.5f" % (name, shape, w)
+        for s in ['cold', 'tlb']:
+            line += " %10.5f %8.2f" % (t.get(s, float('nan')),
+                t.get(s, float('nan')) / w)
+        print(line)
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+
+"""
+Cell-level checkpoints for op_eval.py.
+
+Every measured cell is written to its own JSON file as soon as it finishes,
+named by a hash of everything its result depends on: the definition of the
+row (its label, variant, and the source of its evalop and op, or their repr
+for compiled functions), the input size, dtype, layout and cache state, and
+the environment (CPU, NumPy and BLAS versions, the thread limits of the
+process running the cell). A rerun finds the cells already measured under
+the same definition and environment and skips them; changing an op,
+upgrading NumPy or running with other thread settings measures afresh.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+
+import results
+import sweep
+
+
+@functools.lru_cache(maxsize=None)
+def host():
+    m = results.host_meta()
+    return dict((k, m[k]) for k in ['cpu', 'machine', 'numpy', 'blas'])
+
+
+def env():
+    e = dict(host())
+    e['threads'] = sweep.current_threads()
+    e['thread_vars'] = dict((v, os.environ.get(v, ''))
+        for v in sweep.thread_vars)
+    return e
+
+
+def source(obj):
+    try:
+        return inspect.getsource(obj)
+    except (TypeError, OSError):
+        return repr(obj)
+
+
+def definition(row):
+    return [row.label, row.variant, source(row.evalop)] + [
+        source(a) if callable(a) else repr(a) for a in row.args]
+
+
+def key(suite, row, size, dtype, layout, cache='warm'):
+    k = [env(), suite, definition(row), size, dtype, layout]
+    # warm cells keep the keys they had before cache states existed
+    if cache != 'warm':
+        k.append(cache)
+    blob = json.dumps(k, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+class Store(object):
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def fname(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key):
+        try:
+            with open(self.fname(key)) as f:
+                return json.load(f)['timing']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, timing, **info):
+        """Store a dict of timing fields; `info` is kept for reference."""
+        info['timing'] = timing
+        info['env'] = env()
+        f = self.fname(key)
+        # written aside and renamed, as a crash must not leave half a cell
+        tmp = "%s.%d" % (f, os.getpid())
+        with open(tmp, 'w') as out:
+            json.dump(info, out, default=lambda x: np.asarray(x).tolist())
+        os.replace(tmp, f)
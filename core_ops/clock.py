@@ -0,0 +1,79 @@
+#!/usr/bin/python
+
+"""
+Adaptive timing engine for the op_eval scripts.
+
+A cell is first calibrated: the op is repeated `inner` times per sample so
+that one sample lasts at least `min_sample_ns`, which keeps the small sizes
+well above timer resolution. After a few warmup samples, samples are taken
+until the 95% confidence interval of the mean is within `rel_ci` of the mean
+(or the sample/time budget runs out), so the large sizes stop after a
+handful of runs. With `evict` set, every sample is a single call preceded
+by that flush of the caches, untimed.
+"""
+
+import math
+import time
+
+import numpy as np
+import scipy.stats
+
+min_sample_ns = 2 * 1000 * 1000     # shortest acceptable sample: 2ms
+warmup        = 2                   # samples thrown away before measuring
+min_samples   = 5
+max_samples   = 30
+max_cell_ns   = 10 * 1000 * 1000 * 1000
+rel_ci        = 0.05                # target half-width of CI / mean
+evict         = None                # flush called before every sample, see
+                                    # cachestate.py; samples are then 1 call
+
+
+def run(g, n):
+    t = time.perf_counter_ns
+    start = t()
+    for _ in range(n):
+        g()
+    return t() - start
+
+
+def calibrate(g, target_ns=None):
+    target_ns = target_ns or min_sample_ns
+    n = 1
+    while True:
+        t = run(g, n)
+        if t >= target_ns:
+            return n
+        # aim slightly past the target, but never grow more than 100x per step
+        grow = 100 if t <= 0 else target_ns * 1.2 / t
+        n = max(n + 1, int(n * min(grow, 100)))
+
+
+def ci_halfwidth(samples, level=0.95):
+    k = len(samples)
+    if k < 2:
+        return float('inf')
+    s = np.std(samples, ddof=1)
+    return scipy.stats.t.ppf(0.5 + level / 2, k - 1) * s / math.sqrt(k)
+
+
+def measure(g, inner=None):
+    """Return the per-call times of `g` in ms and the inner repeat count."""
+    if evict is not None:
+        inner = 1
+    inner = inner or calibrate(g)
+    for _ in range(warmup):
+        run(g, inner)
+
+    samples = []
+    start = time.perf_counter_ns()
+    while len(samples) < max_samples:
+        if evict is not None:
+            evict()
+        samples.append(run(g, inner) / inner / 1e6)
+        if len(samples) < min_samples:
+            continue
+        if ci_halfwidth(samples) <= rel_ci * np.mean(samples):
+            break
+        if time.perf_counter_ns() - start > max_cell_ns:
+            break
+    return np.array(samples), inner
@@ -0,0 +1,140 @@
+#!/usr/bin/python
+
+"""
+Compare two benchmark runs and report significant changes.
+
+Each run is a list of result files or directories of them (see results.py).
+Cells are matched on suite, op, parameters, variant, shape, dtype, memory
+layout, cache state, library and thread count. For every matched cell the
+raw samples are compared with a Mann-Whitney U test (p-values corrected for
+the number of cells with Benjamini-Hochberg) and the ratio new/base of the
+medians gets a bootstrap confidence interval. A cell changed significantly
+if its corrected p-value is below --alpha and its interval excludes 1.
+
+The exit status is 1 if the whole ratio interval of a significant
+regression lies above 1 + --fail (e.g. 0.1 for 10%), so the script can gate
+a library upgrade.
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+import scipy.stats
+
+import results
+
+key_columns = ['suite', 'op', 'param', 'variant', 'shape', 'dtype', 'layout',
+    'cache', 'library', 'threads']
+
+
+def expand(paths):
+    fnames = []
+    for p in paths:
+        if os.path.isdir(p):
+            fnames.extend(sorted(glob.glob(os.path.join(p, '*.npz'))))
+        else:
+            fnames.append(p)
+    return fnames
+
+
+def keys(res):
+    return [tuple(res[c][i] for c in key_columns)
+        for i in range(len(res['op']))]
+
+
+def bootstrap_ratio(a, b, n_boot, level, rs):
+    """Confidence interval of median(b) / median(a)."""
+    ma = np.median(a[rs.randint(0, len(a), (n_boot, len(a)))], axis=1)
+    mb = np.median(b[rs.randint(0, len(b), (n_boot, len(b)))], axis=1)
+    q = (1 - level) / 2
+    return np.quantile(mb / ma, [q, 1 - q])
+
+
+def bh(p):
+    """Benjamini-Hochberg adjusted p-values."""
+    p = np.asarray(p, float)
+    if len(p) == 0:
+        return p
+    order = np.argsort(p)
+    adj = p[order] * len(p) / np.arange(1, len(p) + 1)
+    adj = np.minimum.accumulate(adj[::-1])[::-1]
+    out = np.empty_like(p)
+    out[order] = np.minimum(adj, 1)
+    return out
+
+
+def compare(base, new, n_boot=2000, level=0.95, seed=0):
+    rs = np.random.RandomState(seed)
+    index = dict((k, i) for i, k in enumerate(keys(base)))
+    rows = []
+    for j, k in enumerate(keys(new)):
+        i = index.get(k)
+        if i is None:
+            continue
+        a, b = results.samples(base, i), results.samples(new, j)
+        if len(a) < 3 or len(b) < 3:
+            continue
+        p = scipy.stats.mannwhitneyu(a, b, alternative='two-sided')[1]
+        lo, hi = bootstrap_ratio(a, b, n_boot, level, rs)
+        rows.append(k + (np.median(a), np.median(b),
+            np.median(b) / np.median(a), lo, hi, p))
+    if rows:
+        q = bh([r[-1] for r in rows])
+        rows = [r[:-1] + (qi,) for r, qi in zip(rows, q)]
+    return rows
+
+
+def label(r):
+    suite, op, param, variant, shape, dtype, layout, cache, lib, threads = \
+        r[:10]
+    op = op + '_' if variant == 'out' else op
+    op = "%s(%s)" % (op, param) if param else op
+    dtype = dtype if layout == 'C' else "%s/%s" % (dtype, layout)
+    dtype = dtype if cache == 'warm' else "%s/%s" % (dtype, cache)
+    return "%s/%s %s %s %s t=%d" % (suite, op, shape, dtype, lib, threads)
+
+
+def report(rows, alpha):
+    sig = [r for r in rows if r[-1] < alpha and (r[-3] > 1 or r[-2] < 1)]
+    worse = sorted([r for r in sig if r[-4] > 1], key=lambda r: -r[-4])
+    better = sorted([r for r in sig if r[-4] < 1], key=lambda r: r[-4])
+    fmt = "%-60s %10.5f %10.5f %7.3f [%.3f, %.3f] %8.2g"
+    head = "%-60s %10s %10s %7s %16s %8s" % ('cell', 'base(ms)', 'new(ms)',
+        'ratio', 'ci', 'q')
+    for title, rs in [('Regressions', worse), ('Improvements', better)]:
+        print("%s (%d of %d cells)" % (title, len(rs), len(rows)))
+        if rs:
+            print(head)
+        for r in rs:
+            print(fmt % ((label(r),) + tuple(r[-6:])))
+        print("")
+    return worse
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare two benchmark runs.')
+    parser.add_argument('base', nargs='+',
+        help='result files or directories of the reference run')
+    parser.add_argument('--new', nargs='+', required=True,
+        help='result files or directories of the run under test')
+    parser.add_argument('--alpha', type=float, default=0.01,
+        help='significance level after correction (default 0.01)')
+    parser.add_argument('--level', type=float, default=0.95,
+        help='confidence level of the ratio intervals')
+    parser.add_argument('--boot', type=int, default=2000,
+        help='bootstrap resamples')
+    parser.add_argument('--fail', type=float, default=0.1,
+        help='exit non-zero if the ratio interval of a significant '
+             'regression lies above 1 + FAIL (default 0.1); negative disables')
+    args = parser.parse_args()
+
+    base = results.load(expand(args.base))
+    new = results.load(expand(args.new))
+    rows = compare(base, new, args.boot, args.level)
+    worse = report(rows, args.alpha)
+    if args.fail >= 0 and any(r[-3] > 1 + args.fail for r in worse):
+        sys.exit(1)
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+
+"""
+Hardware performance counters of an op call, through Linux perf_event_open.
+
+`Counters` opens one counter per event below for the calling thread (user
+space only, so that it works at perf_event_paranoid 2), and `profile(g,
+inner)` reads them around a few batches of `inner` calls of g, giving
+counts per call with keys prefixed by `hw_`. Counters the kernel, the CPU
+or a container refuses are left out; if none opens, `profile` returns None
+and the timings stand alone. Counts are scaled for multiplexing when the
+PMU has fewer counters than events. Threads a BLAS library started before
+the counters opened are not counted.
+"""
+
+import ctypes
+import fcntl
+import os
+import platform
+import struct
+
+syscall_nr = {'x86_64': 298, 'aarch64': 241, 'ppc64le': 319, 's390x': 331,
+    'i686': 336, 'armv7l': 364}.get(platform.machine())
+
+PERF_TYPE_HARDWARE = 0
+PERF_TYPE_HW_CACHE = 3
+PERF_FORMAT_TOTAL_TIME_ENABLED = 1
+PERF_FORMAT_TOTAL_TIME_RUNNING = 2
+IOC_ENABLE, IOC_DISABLE, IOC_RESET = 0x2400, 0x2401, 0x2403
+
+# flags bits: disabled, exclude_kernel, exclude_hv
+flags = (1 << 0) | (1 << 5) | (1 << 6)
+
+
+def cache_event(cache, op=0, result=1):
+    """HW_CACHE config: cache id, read op, miss result."""
+    return cache | (op << 8) | (result << 16)
+
+
+# name: (type, config)
+events = [
+    ('cycles',        (PERF_TYPE_HARDWARE, 0)),
+    ('instructions',  (PERF_TYPE_HARDWARE, 1)),
+    ('llc_misses',    (PERF_TYPE_HW_CACHE, cache_event(2))),
+    ('branch_misses', (PERF_TYPE_HARDWARE, 5)),
+    ('dtlb_misses',   (PERF_TYPE_HW_CACHE, cache_event(3))),
+]
+
+libc = ctypes.CDLL(None, use_errno=True)
+
+
+def perf_event_open(type_, config):
+    attr = struct.pack('IIQQQQQ', type_, 128, config, 0, 0,
+        PERF_FORMAT_TOTAL_TIME_ENABLED | PERF_FORMAT_TOTAL_TIME_RUNNING, flags)
+    attr = ctypes.create_string_buffer(attr.ljust(128, b'\0'), 128)
+    # this thread, any cpu, no group
+    fd = libc.syscall(syscall_nr, attr, 0, -1, -1, 0)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+    return fd
+
+
+class Counters(object):
+
+    def __init__(self, names=None):
+        self.fds = []
+        self.errors = {}
+        if syscall_nr is None:
+            self.errors['*'] = 'unsupported machine'
+            return
+        for name, (type_, config) in events:
+            if names and name not in names:
+                continue
+            try:
+                self.fds.append((name, perf_event_open(type_, config)))
+            except OSError as e:
+                self.errors[name] = e.strerror
+
+    @property
+    def available(self):
+        return len(self.fds) > 0
+
+    def start(self):
+        for _, fd in self.fds:
+            fcntl.ioctl(fd, IOC_RESET, 0)
+        for _, fd in self.fds:
+            fcntl.ioctl(fd, IOC_ENABLE, 0)
+
+    def stop(self):
+        for _, fd in self.fds:
+            fcntl.ioctl(fd, IOC_DISABLE, 0)
+        counts = {}
+        for name, fd in self.fds:
+            value, enabled, running = struct.unpack('QQQ', os.read(fd, 24))
+            counts[name] = value * float(enabled) / running if running else \
+                float('nan')
+        return counts
+
+    def close(self):
+        for _, fd in self.fds:
+            os.close(fd)
+        self.fds = []
+
+
+_counters = None
+
+
+def shared():
+    """The counters of this process, opened on first use."""
+    global _counters
+    if _counters is None:
+        _counters = Counters()
+    return _counters
+
+
+def available():
+    return shared().available
+
+
+def profile(g, inner=1, batches=5):
+    """Counts per call of g (the median batch), or None without counters."""
+    c = shared()
+    if not c.available:
+        return None
+    g()
+    runs = []
+    for _ in range(batches):
+        c.start()
+        for _ in range(inner):
+            g()
+        runs.append(c.stop())
+    out = {}
+    for name in runs[0]:
+        vals = sorted(r[name] for r in runs)
+        out['hw_' + name] = vals[len(vals) // 2] / inner
+    return out
+
+
+def derive(counts, size):
+    """IPC and misses per element from the counts of one call."""
+    nan = float('nan')
+    cyc = counts.get('hw_cycles', nan)
+    out = {'hw_ipc': counts.get('hw_instructions', nan) / cyc if cyc else nan}
+    for name in ['llc_misses', 'branch_misses', 'dtlb_misses']:
+        out['hw_%s_per_elem' % name] = counts.get('hw_' + name, nan) / size
+    return out
+
+
+if __name__ == '__main__':
+    import numpy as np
+    x = np.random.rand(1 << 20)
+    c = shared()
+    print("opened: %s" % ', '.join(n for n, _ in c.fds))
+    for name, err in sorted(c.errors.items()):
+        print("unavailable: %s (%s)" % (name, err))
+    print(profile(lambda: np.sum(x), 10))
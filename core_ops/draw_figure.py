@@ -1,12 +1,29 @@
 #!/usr/bin/python
 
+"""
+Figures of the op_eval results.
+
+Results are loaded once. Every figure is a job, (file name, draw function,
+the rows it shows, options), rendered in a pool of processes and closed as
+soon as it is saved. A figure is only drawn again when its rows, its
+options or this script changed since it was last drawn: fig/.rendered.json
+keeps a hash of the input of every figure.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
 import os
-import csv
 import numpy as np
 import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import matplotlib.pylab as pylab
-import collections
+
+import cachegrid
+import model
+import results
+import roofline
 
 font=14 #'x-large'
 params = {'legend.fontsize': font,
@@ -17,305 +34,418 @@ params = {'legend.fontsize': font,
          'ytick.labelsize':font}
 matplotlib.rcParams.update(params)
 
-figs = []; axes = []
 linestyle = ['-','--','-.']
 markers   = ['^','o','s']
 hatches   = ['/', '\\', '.']
+libs      = [('owl', 'Owl'), ('numpy', 'Numpy'), ('julia', 'Julia')]
 
 
 """
-1. Draw simple operations
+0. Load every result file of every library at once, see results.py
 """
 
-def draw_simple():
-    simple_data = []
-    for f in ['simple_owl.csv', 'simple_np.csv', 'simple_julia.csv']:
-        simple_owl_dict = {}
-        simple_owl = open(f, 'rb')
-        reader_owl = csv.reader(simple_owl, delimiter=',')
-        header_owl = reader_owl.next()
-        header_owl = header_owl[1:len(header_owl):2]
-        header_owl = [int(float((x))) for x in header_owl]
-        for val in reader_owl:
-            name = val[0]
-            mean = []; std  = []
-            for i in xrange(1, len(val) - 1, 2):
-                mean.append(float(val[i].strip()))
-                std.append(float(val[i+1].strip()))
-            simple_owl_dict[name] = (mean, std)
-        simple_owl.close()
-        simple_data.append(simple_owl_dict)
-
-    keys = simple_data[0].keys()#[0:9]
-    for i, op in enumerate(keys):
-        fig, axis = plt.subplots(1,1)
-        rects = []
-        for j, lib in enumerate(['Owl', 'Numpy', 'Julia']):
-            rects.append(axis.errorbar(header_owl, simple_data[j][op][0], 
-                yerr=simple_data[j][op][1], linestyle=linestyle[j], 
-                marker=markers[j], label=lib))
-        axis.set_xscale('log')
-        axis.legend()
-        axis.set_ylabel('Time(ms)')
-        axis.set_xlabel('Input array size')
-        axis.set_title(op)
-        figs.append(fig)
-        axes.append(axis)
+def result_files():
+    fnames = []
+    for suite in ['simple', 'simple_out', 'axis', 'axis_out', 'axes', 'repeat',
+            'slice', 'linalg', 'batched', 'tall', 'index', 'conv', 'ooc',
+            'expr']:
+        for f in [suite + '_owl.csv', suite + '_np.npz', suite + '_julia.csv']:
+            if os.path.exists(f):
+                fnames.append(f)
+    return fnames
+
+
+def series(res):
+    """x (edge length of the input), mean and std, ordered by size."""
+    order = np.argsort(res['size'], kind='stable')
+    x = np.round(res['size'] ** (1. / res['ndim'])).astype(int)
+    return x[order], res['mean'][order], res['std'][order]
+
+
+def draw_caches(axis, res):
+    ndim = res['ndim'].max()
+    for level, n in cachegrid.boundaries():
+        x = n ** (1. / ndim)
+        if not res['size'].min() <= n <= res['size'].max():
+            continue
+        axis.axvline(x, color='grey', linestyle=':', linewidth=1)
+        axis.text(x, 1, ' L%d' % level, transform=axis.get_xaxis_transform(),
+            va='top', fontsize=8, color='grey')
 
 
 """
-2. Draw axis operations
+1. Draw one op of a suite against its input size, per library and parameter;
+the in-place suite, if any, is drawn next to the allocating one
 """
 
-def draw_axis():
-    axis_data = []
-    for f in ['axis_owl.csv', 'axis_np.csv', 'axis_julia.csv']:
-        axis_owl_dict = collections.defaultdict(dict)
-        axis_owl = open(f, 'rb')
-        reader_owl_ax = csv.reader(axis_owl, delimiter=',')
-        header_owl_ax = reader_owl_ax.next()
-        header_owl_ax = header_owl_ax[1:len(header_owl_ax):2]
-        for val in reader_owl_ax:
-            name = val[0].split('(')[0]
-            axis = val[0][-2]; 
-            mean = []; std  = []
-            for i in xrange(1, len(val) - 1, 2):
-                mean.append(float(val[i].strip()))
-                std.append(float(val[i+1].strip()))
-            axis_owl_dict[name][int(axis)] = (mean, std)
-        axis_owl.close()
-        axis_data.append(axis_owl_dict)
-
-    figs_axis= []; axes_axis = []
-    keys = axis_data[0].keys()
-    for i, op in enumerate(keys):
-        fig, axis = plt.subplots(1,1)
-        rects = []
-        for a in axis_data[0][op].keys():
-            for j, lib in enumerate(['Owl', 'Numpy', 'Julia']):
-                rects.append(axis.errorbar(header_owl_ax, axis_data[j][op][a][0], 
-                    yerr=axis_data[j][op][a][1], linestyle=linestyle[j], marker=markers[j],
-                    label=lib + ', axis=' + str(a)))
-        #axis.set_xscale('log')
+def draw_fit(axis, s, color):
+    """The fitted model of a series (see model.py), dotted, over its sizes."""
+    f = model.fit_res(s)
+    if f is None:
+        return
+    ndim = s['ndim'].max()
+    n = np.geomspace(s['size'].min(), s['size'].max(), 100)
+    w = [model.work(s['op'][0], s['param'][0], model.cube(k, ndim),
+        s['dtype'][0]) for k in n]
+    axis.plot(n ** (1. / ndim), model.predict(f, w), linestyle=':',
+        color=color, linewidth=1)
+
+
+def draw_lines(res, op, xlabel, logx, rename=None, facet=None, caches=False,
+        fits=False):
+    panels = np.unique(res[facet]) if facet else [None]
+    fig, row = plt.subplots(1, len(panels), squeeze=False, sharey=True,
+        figsize=(6.4 * len(panels), 4.8))
+    for axis, p in zip(row[0], panels):
+        r = res if p is None else results.select(res, **{facet: p})
+        # inputs not told apart by panels are told apart by labels
+        inputs = list(dict.fromkeys(zip(r['dtype'], r['layout'],
+            r['cache'])))
+        for a in np.unique(r['param']):
+          for v in np.unique(r['variant']):
+            for d, l, c in inputs:
+              for j, (lib, name) in enumerate(libs):
+                s = results.select(r, param=a, variant=v, dtype=d, layout=l,
+                    cache=c, library=lib)
+                if len(s['op']) == 0:
+                    continue
+                x, m, sd = series(s)
+                label = a.replace(*rename) if rename else a
+                label = name + (', ' + label if a else '')
+                label += ', out' if v == 'out' else (', ' + v if v else '')
+                label += ', %s %s %s' % (d, l, c) if len(inputs) > 1 else ''
+                line = axis.errorbar(x, m, yerr=sd, linestyle=linestyle[j],
+                    marker=markers[j], label=label,
+                    fillstyle='none' if v == 'out' else 'full')
+                if fits:
+                    draw_fit(axis, s, line[0].get_color())
+        if logx:
+            axis.set_xscale('log')
+        if caches and len(r['op']):
+            draw_caches(axis, r)
         axis.legend()
-        axis.set_ylabel('Time(ms)')
-        axis.set_xlabel('Input array size')
-        axis.set_title(op)
-        figs.append(fig)
-        axes.append(axis)
+        axis.set_xlabel(xlabel)
+        axis.set_title(op if p is None else "%s, %s" % (op, p))
+    row[0][0].set_ylabel('Time(ms)')
+    return fig
+
+
+# suite, x label, log x axis, renaming in the parameter labels
+line_suites = [
+    ('simple', 'Input array size', True, None),
+    ('axis', 'Input array size', False, None),
+    ('axes', 'Single dimension size for a 4d array input', False, None),
+    ('repeat', 'Single dimension size for a 4d array input', False,
+        ('axes', 'axis')),
+    ('linalg', 'Height and width size of input matrix', True, None),
+    ('index', 'Height and width size of input matrix', True, None),
+    ('expr', 'Input array size', True, None),
+]
 
 
 """
-2.5. Draw axes operations
+2. Draw slicing operations
 """
 
-def draw_axes():
-    multiaxes_data = []
-    for f in ['axes_owl.csv', 'axes_np.csv', 'axes_julia.csv']:
-        multiaxes_dict = collections.defaultdict(dict)
-        multiaxes_file = open(f, 'rb')
-        reader_multiaxes = csv.reader(multiaxes_file, delimiter=',')
-        header_multiaxes = reader_multiaxes.next()
-        header_multiaxes = header_multiaxes[1:len(header_multiaxes):2]
-        header_multiaxes = [int(float((x))) for x in header_multiaxes]
-        for val in reader_multiaxes:
-            name = val[0].split('(')[0]
-            ax   = val[0].split('=')[1][:-1]; 
-            mean = []; std  = []
-            for i in xrange(1, len(val) - 1, 2):
-                mean.append(float(val[i].strip()))
-                std.append(float(val[i+1].strip()))
-            multiaxes_dict[name][ax] = (mean, std)
-        multiaxes_file.close()
-        multiaxes_data.append(multiaxes_dict)
-
-    keys = multiaxes_data[0].keys()
-    for i, op in enumerate(keys):
-        fig, axis = plt.subplots(1,1)
-        rects = []
-        for a in multiaxes_data[0][op].keys():
-            rects.append(axis.errorbar(header_multiaxes, multiaxes_data[0][op][a][0], 
-                yerr=multiaxes_data[0][op][a][1], linestyle=linestyle[0], 
-                marker=markers[0], label='Owl, axes=' + a))
-            rects.append(axis.errorbar(header_multiaxes, multiaxes_data[1][op][a][0], 
-                yerr=multiaxes_data[1][op][a][1], linestyle=linestyle[1], 
-                marker=markers[1], label='Numpy, axes=' + a))
-            rects.append(axis.errorbar(header_multiaxes, multiaxes_data[2][op][a][0], 
-                yerr=multiaxes_data[2][op][a][1], linestyle=linestyle[2], 
-                marker=markers[2], label='Julia, axes=' + a))
-        axis.legend()
-        axis.set_ylabel('Time(ms)')
-        axis.set_xlabel('Single dimension size for a 4d array input')
-        axis.set_title(op)
-        figs.append(fig)
-        axes.append(axis)
+def draw_slice(res):
+    # one bar per index and library: warm C-order inputs of a single dtype
+    res = results.select(res, dtype=res['dtype'][0], layout='C', cache='warm')
+    keys = [k[len('index='):] for k in np.unique(res['param'])]
+    shapes = [s for s in dict.fromkeys(res['shape'])]
+
+    bar_width = 0.13
+    fig, axis = plt.subplots(1,1)
+    ind = np.arange(len(keys))
+    counter = 0
+    for sz in shapes:
+        for i, (lib, name) in enumerate(libs):
+            s = results.select(res, shape=sz, library=lib)
+            if len(s['op']) == 0:
+                continue
+            order = np.argsort(s['param'])
+            axis.bar(ind + bar_width * counter, s['mean'][order],
+                bar_width, hatch=hatches[i], yerr=s['std'][order],
+                label=name + ', ' + sz.replace('x', '*'))
+            counter += 1
+    axis.set_xticks(ind + (counter / 2) * bar_width)
+    axis.set_xticklabels(keys, rotation=344)
+    axis.legend()
+    axis.set_ylabel('Time(ms)')
+    axis.set_xlabel('Index')
+    axis.set_title('get_slice')
+    return fig
 
 
 """
-3. Draw repeat operations
+3. Draw the roofline: every cell with a cost model against the machine peaks
+measured by `python roofline.py --probe`
 """
 
-def draw_repeat():
-    repeat_data = []
-    for f in ['repeat_owl.csv', 'repeat_np.csv']:
-        repeat_dict = collections.defaultdict(dict)
-        repeat_file = open(f, 'rb')
-        reader_repeat = csv.reader(repeat_file, delimiter=',')
-        header_repeat = reader_repeat.next()
-        header_repeat = header_repeat[1:len(header_repeat):2]
-        header_repeat = [int(float((x))) for x in header_repeat]
-        for val in reader_repeat:
-            name = val[0].split('(')[0]
-            ax   = val[0].split('=')[1][:-1]; 
-            mean = []; std  = []
-            for i in xrange(1, len(val) - 1, 2):
-                mean.append(float(val[i].strip()))
-                std.append(float(val[i+1].strip()))
-            repeat_dict[name][ax] = (mean, std)
-        repeat_file.close()
-        repeat_data.append(repeat_dict)
-
-    keys = repeat_data[0].keys()
-    for i, op in enumerate(keys):
-        fig, axis = plt.subplots(1,1)
-        rects = []
-        for a in repeat_data[0][op].keys():
-            rects.append(axis.errorbar(header_repeat, repeat_data[0][op][a][0], 
-                yerr=repeat_data[0][op][a][1], linestyle=linestyle[0], 
-                marker=markers[0], label='Owl, axis=' + a))
-            rects.append(axis.errorbar(header_repeat, repeat_data[1][op][a][0], 
-                yerr=repeat_data[1][op][a][1], linestyle=linestyle[1], 
-                marker=markers[1], label='Numpy, axis=' + a))
-        axis.legend()
-        axis.set_ylabel('Time(ms)')
-        axis.set_xlabel('Single dimension size for a 4d array input')
-        axis.set_title(op)
-        figs.append(fig)
-        axes.append(axis)
+def draw_roofline(res, peak):
+    res = roofline.annotate(res)
+    ok = np.isfinite(res['gflops']) & (res['flops'] > 0)
+
+    fig, axis = plt.subplots(1,1)
+    for j, (lib, name) in enumerate(libs):
+        m = ok & (res['library'] == lib)
+        if not m.any():
+            continue
+        ai = res['flops'][m] / res['bytes'][m]
+        axis.scatter(ai, res['gflops'][m], marker=markers[j], label=name,
+            alpha=0.6)
+        # name each op once, at its largest input
+        for op in np.unique(res['op'][m]):
+            k = np.argmax(np.where(res['op'][m] == op, res['size'][m], -1))
+            axis.annotate(op, (ai[k], res['gflops'][m][k]), fontsize=8)
+    x = np.logspace(-3, 3, 200)
+    for key, style in [('gflops', '-'), ('gflops_float32', '--')]:
+        axis.plot(x, np.minimum(peak[key], x * peak['gbps']), 'k' + style,
+            linewidth=1, label=key.replace('gflops', 'peak'))
+    axis.set_xscale('log')
+    axis.set_yscale('log')
+    axis.legend()
+    axis.set_ylabel('GFLOP/s')
+    axis.set_xlabel('Arithmetic intensity (flop/byte)')
+    axis.set_title('roofline (triad %.1f GB/s)' % peak['gbps'])
+    return fig
 
 
 """
-4. Draw slicing operations
+4. Draw memory: peak traced memory per op, for runs made with --memory
 """
 
-def draw_slice():
-    slice_data = []
-    for f in ['slice_owl.csv', 'slice_np.csv', 'slice_julia.csv']:
-        slice_dict = collections.defaultdict(dict)
-        slice_file = open(f, 'rb')
-        reader_slice = csv.reader(slice_file, delimiter=',')
-        header_slice = reader_slice.next()
-        header_slice = header_slice[1:len(header_slice):2]
-        for val in reader_slice:
-            print val
-            name = 'get_slice'
-            idx  = val[0].split('=')[1][:-1]; 
-            mean = []; std  = []
-            for i in xrange(1, len(val) - 1, 2):
-                mean.append(float(val[i].strip()))
-                std.append(float(val[i+1].strip()))
-            slice_dict[name][idx] = (mean, std)
-        slice_file.close()
-        slice_data.append(slice_dict)
-
-    slice_alter = collections.defaultdict(dict)
-    keys = slice_data[0]['get_slice'].keys()
-
-    for i, key in enumerate(keys):
-        for j, lib in enumerate(['Owl','Numpy', 'Julia']):
-            m, s = slice_data[j]['get_slice'][key]
-            for k, sz in enumerate(header_slice):
-                try:
-                    slice_alter[lib][sz][0].append(m[k])
-                    slice_alter[lib][sz][1].append(s[k])
-                except KeyError as e:
-                    slice_alter[lib][sz] = [[m[k]], [s[k]]]
+def draw_memory(s, suite):
+    fig, axis = plt.subplots(1,1)
+    for op, a, v in dict.fromkeys(zip(s['op'], s['param'], s['variant'])):
+        m = (s['op'] == op) & (s['param'] == a) & (s['variant'] == v)
+        order = np.argsort(s['size'][m])
+        label = "%s(%s)" % (op, a) if a else op
+        label += "[%s]" % v if v else ''
+        axis.plot(s['size'][m][order], s['mem_peak'][m][order] / 2**20,
+            marker='o', label=label)
+    axis.set_xscale('log')
+    axis.set_yscale('log')
+    axis.legend(fontsize=8, ncol=2)
+    axis.set_ylabel('Peak memory (MB)')
+    axis.set_xlabel('Input array size')
+    axis.set_title(suite + ' memory')
+    return fig
 
-    bar_width = 0.13
+
+"""
+5. Draw batched linear algebra: GFLOP/s against the number of matrices in a
+stack, one line per matrix shape, a whole-stack call (solid) against a
+Python loop over the matrices (dashed)
+"""
+
+def draw_batched(res, op):
+    res = roofline.annotate(res)
     fig, axis = plt.subplots(1,1)
-    rects = []
-    ind = np.arange(len(keys))
-    counter = 0
-    for j, sz in enumerate(slice_alter[lib].keys()):
-        for i, lib in enumerate(['Owl', 'Numpy', 'Julia']):
-            m, s = slice_alter[lib][sz]
-            rects.append(axis.bar(ind + bar_width * counter, m,
-                bar_width, 
-                hatch=hatches[i],
-                yerr=s,
-                label=lib + ', ' + sz))
-            counter += 1
-        plt.xticks(ind + (counter / 2) * bar_width, keys, rotation='344')
-        axis.legend()
-        axis.set_ylabel('Time(ms)')
-        axis.set_xlabel('Index')
-        axis.set_title('get_slice')
-    figs.append(fig)
-    axes.append(axis)
+    mats = np.array([s.split('x', 1)[1] for s in res['shape']])
+    batch = np.array([int(s.split('x', 1)[0]) for s in res['shape']])
+    for j, (lib, name) in enumerate(libs):
+        for k, m in enumerate(dict.fromkeys(mats)):
+            for v in np.unique(res['variant']):
+                s = (mats == m) & (res['library'] == lib) & \
+                    (res['variant'] == v)
+                if not s.any():
+                    continue
+                order = np.argsort(batch[s])
+                axis.plot(batch[s][order], res['gflops'][s][order],
+                    linestyle='--' if v == 'loop' else '-',
+                    marker=markers[j], color='C%d' % (k % 10),
+                    label='%s, %s%s' % (name, m.replace('x', '*'),
+                        ', loop' if v == 'loop' else ''))
+    axis.set_xscale('log')
+    axis.set_yscale('log')
+    axis.legend(fontsize=8, ncol=2)
+    axis.set_ylabel('GFLOP/s')
+    axis.set_xlabel('Matrices in the stack')
+    axis.set_title(op)
+    return fig
 
 
 """
-5. Draw linalg operations
+6. Draw convolution and pooling: time against input elements, one panel per
+kernel size and stride, one colour per implementation; single-channel images
+are joined by lines, batches of multi-channel ones are scattered around them
 """
 
-def draw_linalg():
-    linalg_data = []
-    for f in ['linalg_owl.csv', 'linalg_np.csv', 'linalg_julia.csv']:
-        linalg_owl_dict = {}
-        linalg_owl = open(f, 'rb')
-        reader_owl = csv.reader(linalg_owl, delimiter=',')
-        header_owl = reader_owl.next()
-        header_owl = header_owl[1:len(header_owl):2]
-        header_owl = [int(float((x))) for x in header_owl]
-        for val in reader_owl:
-            name = val[0]
-            mean = []; std  = []
-            for i in xrange(1, len(val) - 1, 2):
-                mean.append(float(val[i].strip()))
-                std.append(float(val[i+1].strip()))
-            linalg_owl_dict[name] = (mean, std)
-        linalg_owl.close()
-        linalg_data.append(linalg_owl_dict)
-
-    keys = linalg_data[0].keys()[0:9]
-    for i, op in enumerate(keys):
-        fig, axis = plt.subplots(1,1)
-        rects = []
-        for j, lib in enumerate(['Owl', 'Numpy', 'Julia']):
-            rects.append(axis.errorbar(header_owl, linalg_data[j][op][0], 
-                yerr=linalg_data[j][op][1], linestyle=linestyle[j],
-                marker=markers[j],label=lib))
+def draw_conv(res, op):
+    params = list(dict.fromkeys(res['param']))
+    fig, row = plt.subplots(1, len(params), squeeze=False, sharey=True,
+        figsize=(6.4 * len(params), 4.8))
+    shapes = np.array([[int(d) for d in s.split('x')] for s in res['shape']])
+    single = (shapes[:, 0] == 1) & (shapes[:, 3] == 1)
+    for axis, a in zip(row[0], params):
+        for k, v in enumerate(np.unique(res['variant'])):
+            for j, (lib, name) in enumerate(libs):
+                m = (res['param'] == a) & (res['variant'] == v) & \
+                    (res['library'] == lib)
+                if not m.any():
+                    continue
+                line = m & single
+                order = np.argsort(res['size'][line])
+                axis.plot(res['size'][line][order], res['mean'][line][order],
+                    linestyle=linestyle[j], marker=markers[j],
+                    color='C%d' % k, label='%s, %s' % (name, v))
+                axis.scatter(res['size'][m & ~single],
+                    res['mean'][m & ~single], marker=markers[j],
+                    color='C%d' % k, alpha=0.5)
         axis.set_xscale('log')
+        axis.set_yscale('log')
         axis.legend()
-        axis.set_ylabel('Time(ms)')
-        axis.set_xlabel('Height and width size of input matrix')
-        axis.set_title(op)
-        figs.append(fig)
-        axes.append(axis)
-
+        axis.set_xlabel('Input array size')
+        axis.set_title('%s, %s' % (op, a))
+    row[0][0].set_ylabel('Time(ms)')
+    return fig
 
-draw_simple()
-draw_axis()
-draw_axes()
-draw_repeat()
-draw_slice()
-draw_linalg()
 
 """
-Output method #1: direct
+7. Draw out-of-core runs (see ooc.py): sustained GB/s against chunk size,
+one line per axis, advice and prefetch thread count
 """
 
-#plt.show()
+def draw_ooc(res, op):
+    fig, axis = plt.subplots(1,1)
+    p = [dict(kv.split('=') for kv in a.split(',')) for a in res['param']]
+    mb = np.array([int(x['chunk'].rstrip('MB')) for x in p])
+    runs = np.array(['axis=%s, %s, %s threads' % (x['axis'], x['advice'],
+        x['workers']) for x in p])
+    moved = res['size'] * 4. * (2 if op in ['cumprod', 'cummax'] else 1)
+    gbps = moved / res['mean'] * 1e-6
+    for k, r in enumerate(dict.fromkeys(runs)):
+        m = runs == r
+        order = np.argsort(mb[m])
+        axis.plot(mb[m][order], gbps[m][order], marker=markers[k % 3],
+            linestyle=linestyle[k % 3], label=r)
+    axis.set_xscale('log')
+    axis.legend(fontsize=8)
+    axis.set_ylabel('GB/s')
+    axis.set_xlabel('Chunk size (MB)')
+    axis.set_title('%s, %s out of core' % (op, res['shape'][0]))
+    return fig
+
 
 """
-Output method #2: save as file
+8. Figures as jobs: (file name, draw function, rows, options)
 """
 
-prefix = 'fig/'
-if not os.path.exists(prefix):
-    os.makedirs(prefix)
-
-counter = 0
-for fig in figs:
-    fig.savefig(prefix +'op_eval' + str(counter) + '.png', dpi=500)
-    counter += 1
+def jobs(data, facet=None, caches=False, fits=False):
+    out = []
+    for suite, xlabel, logx, rename in line_suites:
+        res = results.select(data,
+            np.isin(data['suite'], [suite, suite + '_out']))
+        for op in np.unique(res['op']):
+            out.append(('%s_%s.png' % (suite, op), 'draw_lines',
+                results.select(res, op=op), dict(op=op, xlabel=xlabel,
+                logx=logx, rename=rename, facet=facet, caches=caches,
+                fits=fits)))
+    res = results.select(data, suite='slice')
+    if len(res['op']):
+        out.append(('slice.png', 'draw_slice', res, {}))
+    # the figures below show warm caches only
+    for suite in ['batched', 'tall']:
+        res = results.select(data, suite=suite, cache='warm')
+        for op in np.unique(res['op']):
+            out.append(('%s_%s.png' % (suite, op), 'draw_batched',
+                results.select(res, op=op), dict(op=op)))
+    res = results.select(data, suite='conv', cache='warm')
+    for op in np.unique(res['op']):
+        out.append(('conv_%s.png' % op, 'draw_conv',
+            results.select(res, op=op), dict(op=op)))
+    res = results.select(data, suite='ooc')
+    for op in np.unique(res['op']):
+        out.append(('ooc_%s.png' % op, 'draw_ooc', results.select(res, op=op),
+            dict(op=op)))
+    if os.path.exists(roofline.peak_file):
+        out.append(('roofline.png', 'draw_roofline', data,
+            dict(peak=roofline.load_peak())))
+    res = results.select(data, mask=np.isfinite(data['mem_peak']))
+    for suite in dict.fromkeys(res['suite']):
+        out.append(('memory_%s.png' % suite, 'draw_memory',
+            results.select(res, suite=suite), dict(suite=suite)))
+    return out
+
+
+def source_digest():
+    """Hash of what the figures depend on besides their rows: the source of
+    this script and of the modules it draws with, and the caches of the
+    host, against which the cache boundaries and fits are drawn."""
+    h = hashlib.sha1(repr(cachegrid.caches()).encode())
+    for m in [None, cachegrid, model, roofline]:
+        fname = m.__file__ if m else __file__
+        with open(os.path.abspath(fname), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def digest(job, dpi, salt=''):
+    fname, draw, res, kw = job
+    h = hashlib.sha1((salt + draw + str(dpi) +
+        json.dumps(kw, sort_keys=True, default=str)).encode())
+    for c in sorted(res):
+        h.update(c.encode())
+        h.update(np.ascontiguousarray(res[c]).tobytes())
+    return h.hexdigest()
+
+
+def render(job, prefix, dpi):
+    fname, draw, res, kw = job
+    fig = globals()[draw](res, **kw)
+    fig.savefig(os.path.join(prefix, fname), dpi=dpi)
+    plt.close(fig)
+    return fname
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Draw the op_eval results.')
+    parser.add_argument('files', nargs='*',
+        help='result files, e.g. bench.npz from orchestrate.py (default: the '
+             'per-suite files of every library in this directory)')
+    parser.add_argument('--facet', choices=['dtype', 'layout', 'cache'],
+        help='draw one panel per input dtype, memory layout or cache state')
+    parser.add_argument('--caches', action='store_true',
+        help='mark where the working set of a unary float32 op fills each '
+             'cache level of this host (see cachegrid.py)')
+    parser.add_argument('--model', action='store_true',
+        help='draw the fitted overhead and throughput model of every line, '
+             'dotted (see model.py)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+        help='figures rendered at a time (default: one per core)')
+    parser.add_argument('--dpi', type=int, default=500)
+    parser.add_argument('-o', '--prefix', default='fig/',
+        help='output directory (default fig/)')
+    parser.add_argument('--force', action='store_true',
+        help='draw every figure, changed or not')
+    args = parser.parse_args()
+
+    prefix = args.prefix
+    if not os.path.exists(prefix):
+        os.makedirs(prefix)
+    state_file = os.path.join(prefix, '.rendered.json')
+    state = {}
+    if os.path.exists(state_file) and not args.force:
+        with open(state_file) as f:
+            state = json.load(f)
+
+    data = results.load(args.files or result_files())
+    salt = source_digest()
+    todo, hashes = [], {}
+    for job in jobs(data, args.facet, args.caches, args.model):
+        hashes[job[0]] = digest(job, args.dpi, salt)
+        if (state.get(job[0]) != hashes[job[0]] or
+                not os.path.exists(os.path.join(prefix, job[0]))):
+            todo.append(job)
+    print("%d figures, %d to draw" % (len(hashes), len(todo)))
+
+    if args.jobs > 1 and len(todo) > 1:
+        with concurrent.futures.ProcessPoolExecutor(args.jobs) as ex:
+            done = list(ex.map(render, todo, [prefix] * len(todo),
+                [args.dpi] * len(todo)))
+    else:
+        done = [render(job, prefix, args.dpi) for job in todo]
+
+    state.update((f, hashes[f]) for f in done)
+    with open(state_file, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
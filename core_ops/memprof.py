@@ -0,0 +1,172 @@
+#!/usr/bin/python
+
+"""
+Memory instrumentation of a single op call.
+
+`profile(g)` calls g twice, and reports on the second call, in bytes (keys
+prefixed with `mem_`):
+
+- peak:     high-water mark of traced memory above what was live before the
+            call (tracemalloc; NumPy reports its array data to tracemalloc),
+            i.e. output plus the largest set of live temporaries;
+- retained: traced memory still held after the call, i.e. the output;
+- fresh:    memory first touched during the call, from minor page faults
+            times the page size; as malloc is told to serve every block
+            above 16KB with its own mmap, and transparent huge pages (which
+            NumPy asks for above 4MB, and which map 2MB in one fault) are
+            turned off for the process, this adds up all large allocations,
+            including temporaries freed before the peak, i.e. the total
+            bytes allocated;
+- peak_rss: growth of the process' resident high-water mark (VmHWM, reset
+            through /proc/self/clear_refs), NaN where that is unsupported;
+- temps:    (peak - retained) / retained, the number of output-sized
+            temporaries alive at the peak; NaN unless the call returns a
+            new array of at least a page (not a scalar, nor an out= buffer).
+
+The calls run in a forked child, so that neither tracing nor the malloc
+settings leak into the timings of the parent; it is meant to be a separate
+pass after timing. The first call is not measured: in the child, the first
+write to a buffer of the parent (an out= argument, an input updated in
+place) copies its pages, which would count as fresh memory.
+
+`python memprof.py` checks that out= calls, a ufunc and an expression chain,
+report no fresh memory.
+"""
+
+import ctypes
+import gc
+import json
+import os
+import resource
+import tracemalloc
+
+import numpy as np
+
+page = resource.getpagesize()
+nan = float('nan')
+M_MMAP_THRESHOLD = -3
+PR_SET_THP_DISABLE = 41
+
+
+def status(key):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(key + ':'):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def reset_hwm():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def minflt():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+
+
+def mmap_everything(threshold=16384):
+    try:
+        return ctypes.CDLL(None).mallopt(M_MMAP_THRESHOLD, threshold) == 1
+    except (OSError, AttributeError):
+        return False
+
+
+def trim():
+    """Give the free pages of the malloc heap back to the system, so that
+    reusing them faults again."""
+    try:
+        ctypes.CDLL(None).malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def small_pages():
+    """One fault per page of every later allocation: no huge pages."""
+    try:
+        return ctypes.CDLL(None).prctl(PR_SET_THP_DISABLE, 1, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def measure(g):
+    mmap_everything()
+    small_pages()
+    # a first call faults in the inputs and out= buffers inherited from the
+    # parent, whose first write in a forked child is a copy-on-write fault
+    g()
+    gc.collect()
+    # the blocks it freed, and those the parent left free, are not fresh
+    # either, once faulted in
+    trim()
+    can_reset = reset_hwm()
+    rss = status('VmRSS')
+    flt = minflt()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    out = g()
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    flt = minflt() - flt
+    hwm = status('VmHWM')
+    # output-sized temporaries only mean something for a new, large output
+    nbytes = out.nbytes if isinstance(out, np.ndarray) else 0
+    del out
+
+    retained = float(cur - base)
+    peak = float(peak - base)
+    temps = (peak - retained) / retained \
+        if nbytes >= page and retained >= nbytes else nan
+    return {
+        'mem_peak': peak,
+        'mem_retained': retained,
+        'mem_fresh': float(flt * page),
+        'mem_peak_rss': float(hwm - rss) if can_reset and hwm else nan,
+        'mem_temps': temps,
+    }
+
+
+def profile(g):
+    if not hasattr(os, 'fork'):
+        return measure(g)
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        try:
+            m = measure(g)
+        except Exception:
+            m = {}
+        os.write(w, json.dumps(m).encode())
+        os._exit(0)
+    os.close(w)
+    with os.fdopen(r, 'rb') as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    return json.loads(data.decode() or '{}')
+
+
+
+if __name__ == '__main__':
+    x = np.ones(1 << 22, np.float32)
+    out = np.empty_like(x)
+    fresh = profile(lambda: np.add(x, 1))['mem_fresh']
+    inplace = profile(lambda: np.add(x, 1, out=out))['mem_fresh']
+    print("add  %8.2f MB fresh" % (fresh / 2 ** 20))
+    print("add_ %8.2f MB fresh" % (inplace / 2 ** 20))
+    assert fresh >= x.nbytes, "np.add: %d bytes fresh" % fresh
+    assert inplace < x.nbytes / 16, "np.add out=: %d bytes fresh" % inplace
+    # the expression chains of op_eval's expr suite, see suite_expr
+    import op_eval
+    chain = profile(lambda: op_eval.sigmoid(x))
+    chain_ = profile(lambda: op_eval.sigmoid_(x, out))['mem_fresh']
+    print("sigmoid  %8.2f MB fresh, %.1f temporaries" % (
+        chain['mem_fresh'] / 2 ** 20, chain['mem_temps']))
+    print("sigmoid_ %8.2f MB fresh" % (chain_ / 2 ** 20))
+    assert chain['mem_fresh'] >= 2 * x.nbytes and chain['mem_temps'] >= 1
+    assert chain_ < x.nbytes / 16, "sigmoid_: %d bytes fresh" % chain_
+    print("ok")
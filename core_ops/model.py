@@ -0,0 +1,212 @@
+#!/usr/bin/python
+
+"""
+Performance models fitted to the op_eval results.
+
+A curve is one op measured over several input sizes, with everything else
+(suite, parameters, variant, dtype, layout, cache state, library, threads)
+fixed. Its time is modelled as
+
+    t(n) = overhead + w(n) / throughput
+
+where w(n) is the work of a call: its elements, or its flops where the cost
+model of roofline.py is not linear in them, n log n for sort and n^3 for the
+linalg ops. The throughput changes wherever the working set leaves a cache
+level (see cachegrid.py), so the model is piecewise: continuous, with one
+slope per segment between the cache boundaries that have enough measured
+sizes on each side. Slopes and overhead are fitted by least squares on the
+relative error and kept non-negative.
+
+`python model.py simple_np.npz simple_owl.csv ...` prints, for every curve,
+the per-call overhead, the cost per unit of work of the last segment (the
+asymptote, which extrapolates to larger inputs) and the residuals of the
+fit; where several libraries ran the same curve, their overhead and
+asymptote are also given relative to the best of them, which tells whether
+a library loses on dispatch or on bandwidth. `--predict N` adds the time
+predicted for N elements, and draw_figure.py --model draws the fits.
+"""
+
+import argparse
+import collections
+import csv
+
+import numpy as np
+import scipy.optimize
+
+import cachegrid
+import results
+import roofline
+
+curve_columns = ['suite', 'op', 'param', 'variant', 'dtype', 'layout',
+    'cache', 'library', 'threads']
+
+min_points = 3      # measured sizes on each side of a breakpoint
+
+# overhead in ms; breaks and slopes in units of work, ms per unit
+Fit = collections.namedtuple('Fit', ['unit', 'overhead', 'breaks', 'slopes',
+    'rms', 'worst'])
+
+
+def unit(op, ndim):
+    if op == 'sort' or op in roofline.linalg or \
+            op in roofline.stacked and ndim == 3:
+        return 'flop'
+    return 'element'
+
+
+def work(op, param, shape, dtype):
+    """Units of work of a call: flops for sort and linalg, else elements."""
+    n = int(np.prod([int(x) for x in shape.split('x')]))
+    if unit(op, shape.count('x') + 1) == 'flop':
+        return roofline.cost(op, param, shape, dtype)[0]
+    return float(n)
+
+
+def arrays(op):
+    """Arrays of the size of the input read and written by a call."""
+    if op in roofline.elementwise:
+        return roofline.elementwise[op][1]
+    if op in roofline.linalg:
+        return roofline.linalg[op][1]
+    return 2
+
+
+def breaks(op, dtype, n, w):
+    """Work at the cache boundaries with at least min_points measured sizes
+    on each side, found from the sizes n and work w of a curve."""
+    sizes = np.unique(n)
+    kept, last = [], 0
+    for _, b in cachegrid.boundaries(dtype, arrays(op) - 1):
+        below = ((sizes > last) & (sizes <= b)).sum()
+        if below >= min_points and (sizes > b).sum() >= min_points:
+            kept.append(b)
+            last = b
+    order = np.argsort(n)
+    return [float(np.exp(np.interp(np.log(b), np.log(n[order]),
+        np.log(w[order])))) for b in kept]
+
+
+def basis(w, bs):
+    """Work done within each segment: columns of the model after the
+    overhead."""
+    edges = [0.] + list(bs) + [np.inf]
+    return np.stack([np.clip(w, lo, hi) - lo
+        for lo, hi in zip(edges[:-1], edges[1:])], axis=1)
+
+
+def fit(op, param, shapes, dtype, mean):
+    """Fit of one curve, None if it has fewer than min_points sizes."""
+    ndim = shapes[0].count('x') + 1
+    n = np.array([np.prod([int(x) for x in s.split('x')]) for s in shapes],
+        dtype=float)
+    if len(np.unique(n)) < min_points:
+        return None
+    w = np.array([work(op, param, s, dtype) for s in shapes])
+    bs = breaks(op, dtype, n, w)
+    a = np.hstack([np.ones((len(w), 1)), basis(w, bs)])
+    # relative error: small and large inputs weigh alike
+    sol = scipy.optimize.lsq_linear(a / mean[:, None], np.ones(len(w)),
+        bounds=(0, np.inf))
+    rel = a.dot(sol.x) / mean - 1
+    return Fit(unit(op, ndim), sol.x[0], bs, list(sol.x[1:]),
+        float(np.sqrt(np.mean(rel ** 2))), float(np.abs(rel).max()))
+
+
+def predict(f, w):
+    """Time in ms of calls of work w."""
+    return f.overhead + basis(np.atleast_1d(np.asarray(w, float)),
+        f.breaks).dot(f.slopes)
+
+
+def cube(n, ndim):
+    """Hypercube shape string of about n elements."""
+    e = max(1, int(round(n ** (1. / ndim))))
+    return 'x'.join([str(e)] * ndim)
+
+
+def fit_res(res):
+    """Fit of the rows of a single curve, from a result table."""
+    return fit(res['op'][0], res['param'][0], list(res['shape']),
+        res['dtype'][0], res['mean'])
+
+
+def curves(res):
+    """(key, fit) of every curve of a result table that can be fitted."""
+    groups = collections.OrderedDict()
+    for i in range(len(res['op'])):
+        k = tuple(res[c][i] for c in curve_columns)
+        groups.setdefault(k, []).append(i)
+    out = []
+    for k, idx in groups.items():
+        f = fit_res(dict((c, res[c][idx]) for c in
+            ['op', 'param', 'shape', 'dtype', 'mean']))
+        if f is not None:
+            out.append((k, f))
+    return out
+
+
+def relative(fits):
+    """(overhead, asymptote) of every curve over the best library's."""
+    best = {}
+    lib = curve_columns.index('library')
+    for k, f in fits:
+        other = k[:lib] + k[lib + 1:]
+        o, s = best.get(other, (np.inf, np.inf))
+        best[other] = (min(o, f.overhead), min(s, f.slopes[-1]))
+    out = []
+    for k, f in fits:
+        o, s = best[k[:lib] + k[lib + 1:]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out.append((np.float64(f.overhead) / o,
+                np.float64(f.slopes[-1]) / s))
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Fit overhead and throughput models to the results.')
+    parser.add_argument('files', nargs='+', help='result files')
+    parser.add_argument('--op', action='append',
+        help='only fit this op, may be repeated')
+    parser.add_argument('--predict', action='append', type=int,
+        help='also print the time predicted for this many elements, may be '
+             'repeated')
+    parser.add_argument('-o', '--output',
+        help='also write the fits to this csv file')
+    args = parser.parse_args()
+
+    res = results.load(args.files)
+    if args.op:
+        res = results.select(res, np.isin(res['op'], args.op))
+    fits = curves(res)
+    rel = relative(fits)
+    predict_at = args.predict or []
+
+    head = ['curve', 'library', 'overhead_us', 'ns_per_unit', 'unit',
+        'segments', 'rms', 'worst', 'overhead_x', 'asymptote_x'] + \
+        ['ms_at_%d' % n for n in predict_at]
+    rows = []
+    for (k, f), (ox, sx) in zip(fits, rel):
+        suite, op, param, variant, dtype, layout, cache, lib, threads = k
+        name = "%s/%s" % (suite, op) + ("(%s)" % param if param else '') + \
+            ("[%s]" % variant if variant else '') + " %s" % dtype + \
+            ('' if layout == 'C' else ' ' + layout) + \
+            ('' if cache == 'warm' else ' ' + cache)
+        ndim = res['ndim'][res['op'] == op].max()
+        ps = [predict(f, work(op, param, cube(n, ndim), dtype))[0]
+            for n in predict_at]
+        rows.append([name, lib, f.overhead * 1e3, f.slopes[-1] * 1e6, f.unit,
+            len(f.slopes), f.rms, f.worst, ox, sx] + ps)
+
+    print("%-48s %-6s %12s %12s %-7s %3s %7s %7s %6s %6s" % ('curve', 'lib',
+        'overhead us', 'ns/unit', 'unit', 'seg', 'rms', 'worst', 'ovh x',
+        'asym x') + ''.join(" %12s" % ('ms@%d' % n) for n in predict_at))
+    for r in rows:
+        print("%-48s %-6s %12.3f %12.5f %-7s %3d %6.1f%% %6.1f%% %6.2f %6.2f"
+            % tuple(r[:6] + [100 * r[6], 100 * r[7]] + r[8:10]) +
+            ''.join(" %12.5f" % p for p in r[10:]))
+    if args.output:
+        with open(args.output, 'w') as f:
+            w = csv.writer(f)
+            w.writerow(head)
+            w.writerows(rows)
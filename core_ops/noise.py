@@ -0,0 +1,134 @@
+#!/usr/bin/python
+
+"""
+State of the host during a benchmark run, and detection of disturbances.
+
+`snapshot()` reads the CPU frequency governors, whether turbo is on, the
+load average, the mean clock frequency the kernel reports, and the time of
+a fixed probe: a few batches of dot products small enough to stay in L1, so
+that its time follows the clock frequency and the share of the core the
+process gets. A `Monitor` takes a snapshot when it starts, as a baseline,
+then `check()` after every cell probes again, and every `period` seconds
+takes a whole snapshot; it returns why the cell that just ran should not be
+trusted: a probe slower than the baseline by more than `tol`, a governor or
+turbo state that changed, or more load than cores.
+"""
+
+import glob
+import os
+import time
+
+import numpy as np
+
+period = 30.        # seconds between whole snapshots
+tol    = 0.15       # probe slowdown taken for a disturbance
+
+cpufreq = '/sys/devices/system/cpu'
+
+
+def read(fname):
+    try:
+        with open(fname) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def governors():
+    """Distinct scaling governors of the cores, comma-separated, '' if the
+    kernel does not expose cpufreq."""
+    g = set(read(f) for f in glob.glob(os.path.join(cpufreq, 'cpu[0-9]*',
+        'cpufreq', 'scaling_governor')))
+    return ','.join(sorted(x for x in g if x))
+
+
+def turbo():
+    """'on', 'off', or '' when unknown."""
+    no_turbo = read(os.path.join(cpufreq, 'intel_pstate', 'no_turbo'))
+    if no_turbo is not None:
+        return 'off' if no_turbo == '1' else 'on'
+    boost = read(os.path.join(cpufreq, 'cpufreq', 'boost'))
+    if boost is not None:
+        return 'on' if boost == '1' else 'off'
+    return ''
+
+
+def mhz():
+    """Mean current frequency of the cores, NaN if unknown."""
+    f = []
+    for line in (read('/proc/cpuinfo') or '').splitlines():
+        if line.startswith('cpu MHz'):
+            f.append(float(line.split(':')[1]))
+    return float(np.mean(f)) if f else float('nan')
+
+
+_x = np.ones(1024)
+
+
+def probe(batches=5, calls=200):
+    """Median time in ms of a batch of `calls` small dot products."""
+    t = []
+    for _ in range(batches):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            np.dot(_x, _x)
+        t.append((time.perf_counter_ns() - start) / 1e6)
+    return float(np.median(t))
+
+
+def snapshot():
+    return {
+        'time': time.time(),
+        'governor': governors(),
+        'turbo': turbo(),
+        'load': os.getloadavg()[0],
+        'mhz': mhz(),
+        'probe_ms': probe(),
+    }
+
+
+def warnings(s):
+    """What in a snapshot makes timings less reproducible to begin with."""
+    w = []
+    if s['governor'] and s['governor'] != 'performance':
+        w.append("governor %s, not performance" % s['governor'])
+    if s['turbo'] == 'on':
+        w.append("turbo on")
+    if s['load'] > os.cpu_count():
+        w.append("load %.1f on %d cores" % (s['load'], os.cpu_count()))
+    return w
+
+
+class Monitor(object):
+
+    def __init__(self):
+        self.base = snapshot()
+        self.base['probe_ms'] = float(np.median([probe() for _ in range(3)]))
+        self.log = [self.base]
+
+    def check(self):
+        """(reasons, snapshot): what disturbed the host since the last
+        check, and the whole snapshot if one was due, else None."""
+        reasons = []
+        p = probe()
+        if p > self.base['probe_ms'] * (1 + tol):
+            reasons.append("probe +%d%%" % round(
+                100 * (p / self.base['probe_ms'] - 1)))
+        s = None
+        if time.time() - self.log[-1]['time'] >= period:
+            s = snapshot()
+            self.log.append(s)
+            for k in ['governor', 'turbo']:
+                if s[k] != self.base[k]:
+                    reasons.append("%s %s" % (k, s[k]))
+            if s['load'] > os.cpu_count():
+                reasons.append("load %.1f" % s['load'])
+        return reasons, s
+
+
+if __name__ == '__main__':
+    s = snapshot()
+    for k in sorted(s):
+        print("%-9s %s" % (k, s[k]))
+    for w in warnings(s):
+        print("warning: %s" % w)
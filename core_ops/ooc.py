@@ -0,0 +1,231 @@
+#!/usr/bin/python
+
+"""
+Out-of-core reductions and scans over memory-mapped arrays.
+
+The axis suite of op_eval.py keeps its inputs in RAM. Here the input is a
+float32 matrix on disk, by default half as large again as the RAM of the
+host, written once through `np.memmap` and mapped read-only. Each op of
+the axis suite (max, sum, prod, cumprod, cummax) runs over it chunk by chunk
+of rows: along axis 1 every chunk is independent, along axis 0 the partial
+results of a chunk are folded into those of the previous ones (scans carry
+their last row). Scans write their output to a second mapped file.
+
+A run is set by its chunk size, the `madvise` advice of the mapping
+('normal', 'sequential', or 'willneed', which also asks for the next chunk
+ahead of time) and a number of prefetch threads that fault in the chunks
+ahead while the current one is computed (0 for none). The file is dropped
+from the page cache before every run, so it is read from disk however large
+it is. Sustained throughput is the input (and output) bytes over the time of
+a run; the best chunk size of every op and axis is printed at the end, and
+every run is saved in ooc_np.npz (see results.py), which draw_figure.py
+draws as GB/s against chunk size.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import mmap
+import os
+import time
+
+import numpy as np
+
+import op_eval
+import results
+import sweep
+
+fun = dict(zip(op_eval.fun_axis_arr_name, op_eval.fun_axis_arr))
+
+# how the partial results of two chunks fold along axis 0
+combine = {'max': np.maximum, 'sum': np.add, 'prod': np.multiply,
+    'cumprod': np.multiply, 'cummax': np.maximum}
+scans = ['cumprod', 'cummax']
+
+advices = collections.OrderedDict([
+    ('normal',     mmap.MADV_NORMAL),
+    ('sequential', mmap.MADV_SEQUENTIAL),
+    ('willneed',   mmap.MADV_WILLNEED),
+])
+
+
+def ram_bytes():
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+def create(path, shape, dtype='float32', seed=0, block=1 << 26):
+    """Write the input block by block, unless a file of its size is there."""
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if os.path.exists(path) and os.path.getsize(path) == nbytes:
+        return
+    rows = max(1, block // (shape[1] * np.dtype(dtype).itemsize))
+    rs = np.random.RandomState(seed)
+    tmp = "%s.%d" % (path, os.getpid())
+    m = np.memmap(tmp, dtype=dtype, mode='w+', shape=shape)
+    for i in range(0, shape[0], rows):
+        m[i:i + rows] = rs.rand(min(rows, shape[0] - i), shape[1])
+    m.flush()
+    del m
+    os.replace(tmp, path)
+
+
+class Mapped(object):
+    """A read-only mapping of a matrix file that can be advised and dropped
+    from the page cache."""
+
+    def __init__(self, path, shape, dtype='float32'):
+        self.fd = os.open(path, os.O_RDONLY)
+        self.map = mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ)
+        self.a = np.frombuffer(self.map, dtype).reshape(shape)
+        self.row = shape[1] * np.dtype(dtype).itemsize
+
+    def advise(self, advice, lo=0, hi=None):
+        """madvise rows lo..hi (all by default), widened to whole pages."""
+        start = lo * self.row // mmap.PAGESIZE * mmap.PAGESIZE
+        end = len(self.map) if hi is None else hi * self.row
+        self.map.madvise(advices[advice], start, end - start)
+
+    def drop(self):
+        """Evict the file from the page cache: pages still mapped here are
+        not, so the mapping lets go of them first."""
+        self.map.madvise(mmap.MADV_DONTNEED)
+        os.posix_fadvise(self.fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+    def touch(self, lo, hi):
+        """Fault in rows lo..hi by reading a byte of each page."""
+        return int(self.a[lo:hi].reshape(-1).view(np.uint8)[::mmap.PAGESIZE]
+            .sum())
+
+    def close(self):
+        del self.a
+        self.map.close()
+        os.close(self.fd)
+
+
+def run(src, name, axis, rows, advice, workers, out=None):
+    """One pass of op `name` along `axis`, `rows` rows at a time; scans write
+    into `out`. Returns the result of a reduction."""
+    a, fn = src.a, fun[name]
+    bounds = [(i, min(i + rows, a.shape[0])) for i in range(0, a.shape[0],
+        rows)]
+    src.advise(advice)
+    pool = concurrent.futures.ThreadPoolExecutor(workers) if workers else None
+    ahead = collections.deque()
+    acc = carry = None
+    red = None if name in scans or axis == 0 else \
+        np.empty(a.shape[0], a.dtype)
+    try:
+        for k, (lo, hi) in enumerate(bounds):
+            if pool:
+                while len(ahead) < workers and k + len(ahead) < len(bounds):
+                    ahead.append(pool.submit(src.touch,
+                        *bounds[k + len(ahead)]))
+                ahead.popleft().result()
+            if advice == 'willneed' and k + 1 < len(bounds):
+                src.advise('willneed', *bounds[k + 1])
+            x = a[lo:hi]
+            if name in scans:
+                y = fn(x, axis=axis)
+                if axis == 0:
+                    if carry is not None:
+                        combine[name](y, carry, out=y)
+                    carry = y[-1].copy()
+                out[lo:hi] = y
+            elif axis == 0:
+                part = fn(x, axis=0)
+                acc = part if acc is None else combine[name](acc, part,
+                    out=acc)
+            else:
+                red[lo:hi] = fn(x, axis=1)
+        if out is not None:
+            out.flush()
+    finally:
+        if pool:
+            pool.shutdown()
+    return acc if red is None else red
+
+
+def measure(src, out_path, name, axis, rows, advice, workers, repeats):
+    """Wall-clock ms of every pass, each from a cold page cache."""
+    shape = src.a.shape
+    ts = []
+    for _ in range(repeats):
+        src.drop()
+        out = None
+        if name in scans:
+            out = np.memmap(out_path, dtype=src.a.dtype, mode='w+',
+                shape=shape)
+        start = time.perf_counter_ns()
+        run(src, name, axis, rows, advice, workers, out)
+        ts.append((time.perf_counter_ns() - start) / 1e6)
+        del out
+    return np.array(ts)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Stream the axis ops over memory-mapped inputs.')
+    parser.add_argument('--dir', default=os.environ.get('OP_EVAL_OOC', 'ooc'),
+        help='directory of the input and output files (default ./ooc)')
+    parser.add_argument('--gb', type=float, default=None,
+        help='input size in GB (default 1.5 times the RAM)')
+    parser.add_argument('--cols', type=int, default=4096,
+        help='row length of the input matrix (default 4096)')
+    parser.add_argument('--op', action='append', choices=sorted(fun),
+        help='ops to run (repeatable; default all)')
+    parser.add_argument('--axis', default='0,1')
+    parser.add_argument('--chunk', default='1,4,16,64,256',
+        help='comma-separated chunk sizes in MB (default 1,4,16,64,256)')
+    parser.add_argument('--advice', default='sequential',
+        help='comma-separated madvise advice, among %s (default '
+             'sequential)' % ','.join(advices))
+    parser.add_argument('--workers', default='0,2',
+        help='comma-separated prefetch thread counts (default 0,2)')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('-o', '--output', default='ooc_np.npz')
+    args = parser.parse_args()
+
+    dtype = np.dtype('float32')
+    nbytes = int((args.gb * 2 ** 30) if args.gb else 1.5 * ram_bytes())
+    shape = (max(1, nbytes // (args.cols * dtype.itemsize)), args.cols)
+    if not os.path.exists(args.dir):
+        os.makedirs(args.dir)
+    path = os.path.join(args.dir, 'input_%dx%d.bin' % shape)
+    out_path = os.path.join(args.dir, 'output.bin')
+    print("| input %s, %.1f GB" % (path, nbytes / 2. ** 30))
+    create(path, shape, dtype)
+
+    src = Mapped(path, shape, dtype)
+    recs, best = [], {}
+    try:
+        for name in args.op or op_eval.fun_axis_arr_name:
+            for axis in [int(x) for x in args.axis.split(',')]:
+                for mb in [int(x) for x in args.chunk.split(',')]:
+                    rows = max(1, (mb << 20) // src.row)
+                    for advice in args.advice.split(','):
+                        for workers in [int(x) for x in
+                                args.workers.split(',')]:
+                            ts = measure(src, out_path, name, axis, rows,
+                                advice, workers, args.repeats)
+                            moved = src.a.nbytes * (2 if name in scans else 1)
+                            gbps = moved / np.median(ts) * 1e-6
+                            param = "axis=%d,chunk=%dMB,advice=%s,workers=%d" \
+                                % (axis, mb, advice, workers)
+                            print("| %s(%s) : %.2f GB/s" % (name, param, gbps))
+                            t = op_eval.Timing(np.mean(ts), np.std(ts), ts, 1,
+                                sweep.current_threads(), None, None)
+                            recs.append(results.record('ooc', name, param,
+                                shape, dtype, 'numpy', t))
+                            if gbps > best.get((name, axis), (0, ''))[0]:
+                                best[(name, axis)] = (gbps, param)
+    finally:
+        src.close()
+        if os.path.exists(out_path):
+            os.remove(out_path)
+
+    for (name, axis), (gbps, param) in sorted(best.items()):
+        print("best %-8s axis=%d : %.2f GB/s with %s" % (name, axis, gbps,
+            param))
+    meta = results.host_meta()
+    meta['ram'] = ram_bytes()
+    results.save(args.output, recs, meta)
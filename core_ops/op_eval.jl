@@ -1,12 +1,26 @@
 #!/usr/bin/env julia
 
-# Unary vectorised math operations
+# Julia 1.6 or later
 
-fun_arr_arr = [(+), (.*), (./), (.^), hypot, min, mod]
-fun_arr_arr_name = ["add", "mul", "div", "pow", "hypot", "min2", "fmod"]
+using LinearAlgebra
+using Mmap
+using Printf
+using Statistics
+
+# scalar functions apply to arrays by broadcasting, and reductions take dims
+dot1(f) = x -> f.(x)
+dot2(f) = (x, y) -> f.(x, y)
+fold(f) = (x, d) -> f(x, dims=d)
+cummax(x; dims) = accumulate(max, x, dims=dims)
 
 # Binary vectorised math operations
 
+fun_arr_arr = [(+), dot2(*), dot2(/), dot2(^), dot2(hypot), dot2(min),
+  dot2(mod)]
+fun_arr_arr_name = ["add", "mul", "div", "pow", "hypot", "min2", "fmod"]
+
+# Unary vectorised math operations
+
 function sigmoid(z)
     return 1.0 ./ (1.0 .+ exp.(-z))
 end
@@ -17,17 +31,18 @@ function exp_a(z)
     return exp.(z)
 end
 
-fun_arr = [copy, abs, exp_a, log, sqrt_a, cbrt, sin, tan, 
-  asin, sinh, asinh, round, sort, sigmoid]
+fun_arr = [copy, dot1(abs), exp_a, dot1(log), sqrt_a, dot1(cbrt), dot1(sin),
+  dot1(tan), dot1(asin), dot1(sinh), dot1(asinh), dot1(round), sort, sigmoid]
 fun_arr_name = ["copy", "abs", "exp", "log", "sqrt", "cbrt", "sin", "tan", 
   "asin", "sinh", "asinh", "round", "sort", "sigmoid"]
 
 # Fold and scan operations
 
-fun_axis_arr = [maximum, sum, prod, cumprod, cummax]
+fun_axis_arr = [fold(maximum), fold(sum), fold(prod), fold(cumprod),
+  fold(cummax)]
 fun_axis_arr_name = ["max", "sum", "prod", "cumprod", "cummax"]
 
-fun_axes_arr = [sum]
+fun_axes_arr = [fold(sum)]
 fun_axes_arr_name = ["sum_reduce"]
 
 # Repeat operations
@@ -76,10 +91,26 @@ function timing(fn, msg)
 end
 
 
+# Inputs shared with op_eval.py through OP_EVAL_ARENA, see arena.py;
+# the files are row-major, so they are mapped reversed and transposed back
+
+arena = get(ENV, "OP_EVAL_ARENA", "")
+
+function uniform(sz, seed=0)
+    f = joinpath(arena, @sprintf("uniform_float32_%s_%d.bin", join(sz, "x"), seed))
+    if arena == "" || !isfile(f)
+        return rand(Float32, sz)
+    end
+    d = reverse(Tuple(sz))
+    a = open(io -> Mmap.mmap(io, Array{Float32,length(d)}, d), f)
+    return permutedims(a, length(d):-1:1)
+end
+
+
 function evalop_arr_arr(fn, name, sz)
     function f() 
-        inp1 = rand(Float32, sz)
-        inp2 = rand(Float32, sz)
+        inp1 = uniform(sz, 0)
+        inp2 = uniform(sz, 1)
         discard = fn(inp1, inp2)
         function g()
             return fn(inp1, inp2)
@@ -92,7 +123,7 @@ end
 
 function evalop_arr(fn, name, sz)
     function f() 
-        inp = rand(Float32, sz)
+        inp = uniform(sz)
         discard = fn(inp)
         function g()
             return fn(inp)
@@ -105,7 +136,7 @@ end
 
 function evalop_axis_arr(axis, fn, name, sz)
     function f()
-        inp = rand(Float32, sz)
+        inp = uniform(sz)
         discard = fn(inp, axis)
         function g() 
             return fn(inp, axis)
@@ -118,7 +149,7 @@ end
 
 function evalop_axes_arr(axis, fn, name, sz)
     function f()
-        inp = rand(Float32, sz)
+        inp = uniform(sz)
         discard = fn(inp, axis)
         function g() 
             return fn(inp, axis)
@@ -145,7 +176,7 @@ end
 # TODO : more general unpacking
 function evalop_slice(idx, idx_str, sz)
     function f()
-        inp = rand(Float32, sz)
+        inp = uniform(sz)
         function g()
             i1, i2, i3 = idx
             return inp[i1, i2, i3]
@@ -158,7 +189,7 @@ end
 
 function evalop_linalg(fn, name, sz)
     function f() 
-        inp = rand(Float32, sz)
+        inp = uniform(sz)
         discard = fn(inp)
         function g()
             return fn(inp)
@@ -346,9 +377,115 @@ function write_file(fname, output_str)
 end    
 
 
-write_file("simple_julia.csv", evaluate_simple())
-write_file("axis_julia.csv",   evaluate_axis())
-write_file("axes_julia.csv",   evaluate_axes())
-# write_file("repeat_julia.csv", evaluate_repeat())
-write_file("slice_julia.csv",  evaluate_slice())
-write_file("linalg_julia.csv", evaluate_linalg())
+# Line protocol spoken with orchestrate.py when OP_EVAL_SERVE=1: "ready julia",
+# then for every tab-separated request
+#   cell <suite> <op> <param> <shape d0xd1..> <warmup> <samples> <min_ms>
+# the answer "ok <inner> <ms per call>..." or "err <why>", until "quit".
+
+# "[[0;-1]; []; []]" (Owl's notation, 0-based, inclusive, negative from the
+# end) to Julia indices of an array of size sz
+function owl_index(s, sz)
+    parts = filter(p -> occursin("[", p), split(s[2:end-1], ']'))
+    idx = []
+    for (d, p) in enumerate(parts)
+        p = p[findfirst(isequal('['), p)+1:end]
+        ints = [parse(Int, strip(x)) for x in split(p, ';') if strip(x) != ""]
+        pos(i) = (i < 0 ? sz[d] + i : i) + 1
+        if isempty(ints)
+            push!(idx, Colon())
+        elseif length(ints) == 1
+            push!(idx, pos(ints[1]))
+        else
+            a, b = pos(ints[1]), pos(ints[2])
+            step = length(ints) == 3 ? ints[3] : (a <= b ? 1 : -1)
+            push!(idx, a:step:b)
+        end
+    end
+    return idx
+end
+
+
+function serve_cell(suite, op, param, sz)
+    v = split(param, '=')[end]
+    if suite == "simple" && op in fun_arr_name
+        fn = fun_arr[findfirst(isequal(op), fun_arr_name)]
+        x = uniform(sz[1])
+        return () -> fn(x)
+    elseif suite == "simple"
+        fn = fun_arr_arr[findfirst(isequal(op), fun_arr_arr_name)]
+        x, y = uniform(sz[1], 0), uniform(sz[1], 1)
+        return () -> fn(x, y)
+    elseif suite == "axis"
+        fn = fun_axis_arr[findfirst(isequal(op), fun_axis_arr_name)]
+        axis = parse(Int, v) + 1
+        x = uniform(Tuple(sz))
+        return () -> fn(x, axis)
+    elseif suite == "axes"
+        fn = fun_axes_arr[findfirst(isequal(op), fun_axes_arr_name)]
+        axes = Tuple(parse(Int, a) + 1 for a in split(v, '*'))
+        x = uniform(Tuple(sz))
+        return () -> fn(x, axes)
+    elseif suite == "repeat"
+        fn = fun_repeat[findfirst(isequal(op), fun_repeat_name)]
+        reps = Tuple(parse(Int, a) for a in split(v, '*'))
+        x = uniform(Tuple(sz))
+        return () -> fn(x, reps)
+    elseif suite == "slice"
+        idx = owl_index(v, sz)
+        x = uniform(Tuple(sz))
+        return () -> x[idx...]
+    elseif suite == "linalg"
+        fn = fun_linalg[findfirst(isequal(op), fun_linalg_name)]
+        x = uniform(Tuple(sz))
+        return () -> fn(x)
+    end
+    error("unknown suite " * suite)
+end
+
+
+# calls per sample doubled until a sample lasts min_ms
+function measure(g, warmup, samples, min_ms)
+    run(n) = (@elapsed for _ = 1:n g() end) * 1000
+    inner = 1
+    while run(inner) < min_ms && inner < 2^24
+        inner *= 2
+    end
+    for _ = 1:warmup
+        run(inner)
+    end
+    return inner, [run(inner) / inner for _ = 1:samples]
+end
+
+
+function serve()
+    println("ready\tjulia")
+    flush(stdout)
+    for line in eachline(stdin)
+        f = split(chomp(line), '\t')
+        if f[1] == "quit"
+            break
+        end
+        try
+            sz = [parse(Int, d) for d in split(f[5], 'x')]
+            g = serve_cell(f[2], f[3], f[4], sz)
+            inner, ts = measure(g, parse(Int, f[6]), parse(Int, f[7]),
+                parse(Float64, f[8]))
+            println("ok\t", inner, "\t", join([@sprintf("%.6f", t) for t in ts], "\t"))
+        catch e
+            println("err\t", replace(sprint(showerror, e), '\n' => ' '))
+        end
+        flush(stdout)
+    end
+end
+
+
+if get(ENV, "OP_EVAL_SERVE", "") == "1"
+    serve()
+else
+    write_file("simple_julia.csv", evaluate_simple())
+    write_file("axis_julia.csv",   evaluate_axis())
+    write_file("axes_julia.csv",   evaluate_axes())
+    # write_file("repeat_julia.csv", evaluate_repeat())
+    write_file("slice_julia.csv",  evaluate_slice())
+    write_file("linalg_julia.csv", evaluate_linalg())
+end
@@ -82,10 +82,30 @@ let timing fn msg =
   m_time, s_time
 
 
+(* Inputs shared with op_eval.py through OP_EVAL_ARENA, see arena.py *)
+
+let arena = try Some (Sys.getenv "OP_EVAL_ARENA") with Not_found -> None
+
+let uniform ?(seed=0) sz =
+  let dims = Owl_utils_array.to_string ~sep:"x" string_of_int sz in
+  let f = match arena with
+    | Some d -> Filename.concat d
+        (Printf.sprintf "uniform_float32_%s_%d.bin" dims seed)
+    | None   -> ""
+  in
+  if f = "" || not (Sys.file_exists f) then N.uniform sz
+  else (
+    let fd = Unix.openfile f [Unix.O_RDONLY] 0 in
+    let x = Unix.map_file fd Bigarray.float32 Bigarray.c_layout false sz in
+    Unix.close fd;
+    N.copy x
+  )
+
+
 let evalop_arr_arr fn name sz = 
   let f () = 
-    let inp1 = N.uniform [|sz|] in
-    let inp2 = N.uniform [|sz|] in
+    let inp1 = uniform ~seed:0 [|sz|] in
+    let inp2 = uniform ~seed:1 [|sz|] in
     let g () = fn inp1 inp2 |> ignore in
     Owl_utils.time g
   in 
@@ -94,7 +114,7 @@ let evalop_arr_arr fn name sz =
 
 let evalop_arr fn name sz = 
   let f () = 
-    let inp = N.uniform [|sz|] in
+    let inp = uniform [|sz|] in
     let g () = fn inp |> ignore in
     Owl_utils.time g
   in
@@ -103,7 +123,7 @@ let evalop_arr fn name sz =
 
 let evalop_axis_arr axis fn name sz =
   let f () = 
-    let inp = N.uniform sz in
+    let inp = uniform sz in
     let g () = fn ~axis inp |> ignore in
     Owl_utils.time g
   in
@@ -113,7 +133,7 @@ let evalop_axis_arr axis fn name sz =
 
 let evalop_axes_arr axis fn name sz =
   let f () = 
-    let inp = N.uniform sz in
+    let inp = uniform sz in
     let g () = fn ~axis inp |> ignore in
     Owl_utils.time g
   in
@@ -135,7 +155,7 @@ let evalop_repeat axes fn name sz =
 
 let evalop_slice fn name idx idx_str sz = 
   let f () = 
-    let inp = N.uniform sz in
+    let inp = uniform sz in
     let g () = fn idx inp |> ignore in
     Owl_utils.time g
   in
@@ -320,10 +340,114 @@ let evaluate_linalg () =
   !result_str
 
 
+(* Line protocol spoken with orchestrate.py when OP_EVAL_SERVE=1: "ready owl",
+   then for every tab-separated request
+     cell <suite> <op> <param> <shape d0xd1..> <warmup> <samples> <min_ms>
+   the answer "ok <inner> <ms per call>..." or "err <why>", until "quit". *)
+
+let find name names =
+  let rec go i =
+    if i = Array.length names then raise Not_found
+    else if names.(i) = name then i else go (i + 1)
+  in
+  go 0
+
+(* "axis=0" -> "0", "axes=0*3" -> [|0; 3|] *)
+let param_value p =
+  try String.sub p (String.index p '=' + 1) (String.length p - String.index p '=' - 1)
+  with Not_found -> p
+
+let param_ints p =
+  String.split_on_char '*' (param_value p) |> List.map int_of_string |> Array.of_list
+
+(* "[[0;-1]; []; []]" -> [[0;-1]; []; []] *)
+let parse_index s =
+  let s = String.sub s 1 (String.length s - 2) in
+  String.split_on_char ']' s
+  |> List.filter (fun p -> String.contains p '[')
+  |> List.map (fun p ->
+      let k = String.index p '[' + 1 in
+      String.sub p k (String.length p - k)
+      |> String.split_on_char ';'
+      |> List.map String.trim
+      |> List.filter (fun x -> x <> "")
+      |> List.map int_of_string)
+
+let serve_cell suite op param sz =
+  match suite with
+  | "simple" -> (
+      try
+        let fn = fun_arr.(find op fun_arr_name) in
+        let x = uniform sz in
+        fun () -> fn x |> ignore
+      with Not_found ->
+        let fn = fun_arr_arr.(find op fun_arr_arr_name) in
+        let x = uniform ~seed:0 sz in
+        let y = uniform ~seed:1 sz in
+        fun () -> fn x y |> ignore )
+  | "axis" ->
+      let fn = fun_axis_arr.(find op fun_axis_arr_name) in
+      let axis = int_of_string (param_value param) in
+      let x = uniform sz in
+      fun () -> fn ~axis x |> ignore
+  | "axes" ->
+      let fn = fun_axes_arr.(find op fun_axes_arr_name) in
+      let axis = param_ints param in
+      let x = uniform sz in
+      fun () -> fn ~axis x |> ignore
+  | "repeat" ->
+      let fn = fun_repeat.(find op fun_repeat_name) in
+      let axes = param_ints param in
+      let x = uniform sz in
+      fun () -> fn x axes |> ignore
+  | "slice" ->
+      let idx = parse_index (param_value param) in
+      let x = uniform sz in
+      fun () -> N.get_slice idx x |> ignore
+  | "linalg" ->
+      let fn = fun_linalg.(find op fun_linalg_name) in
+      let x = uniform sz in
+      fun () -> fn x
+  | _ -> failwith ("unknown suite " ^ suite)
+
+(* calls per sample doubled until a sample lasts min_ms *)
+let measure g warmup samples min_ms =
+  let run n = Owl_utils.time (fun () -> for _ = 1 to n do g () done) in
+  let inner = ref 1 in
+  while run !inner < min_ms && !inner < 1 lsl 24 do inner := !inner * 2 done;
+  for _ = 1 to warmup do run !inner |> ignore done;
+  !inner, Array.init samples (fun _ -> run !inner /. float_of_int !inner)
+
+let serve () =
+  print_endline "ready\towl";
+  try
+    while true do
+      let line = input_line stdin in
+      ( match String.split_on_char '\t' line with
+      | ["quit"] -> raise End_of_file
+      | ["cell"; suite; op; param; shape; warmup; samples; min_ms] -> (
+          try
+            let sz = String.split_on_char 'x' shape
+              |> List.map int_of_string |> Array.of_list in
+            let g = serve_cell suite op param sz in
+            let inner, ts = measure g (int_of_string warmup)
+              (int_of_string samples) (float_of_string min_ms) in
+            Printf.printf "ok\t%d\t%s\n" inner (Array.to_list ts
+              |> List.map (Printf.sprintf "%.6f") |> String.concat "\t")
+          with e -> Printf.printf "err\t%s\n" (Printexc.to_string e) )
+      | _ -> print_endline "err\tbad request" );
+      flush stdout
+    done
+  with End_of_file -> ()
+
+
 let _ = 
+  if (try Sys.getenv "OP_EVAL_SERVE" = "1" with Not_found -> false) then
+    serve ()
+  else (
   evaluate_simple  () |> Owl_io.write_file "simple_owl.csv";
   evaluate_axis    () |> Owl_io.write_file "axis_owl.csv" ;
   evaluate_axes    () |> Owl_io.write_file "axes_owl.csv" ;
   evaluate_repeat  () |> Owl_io.write_file "repeat_owl.csv";
   evaluate_slicing () |> Owl_io.write_file "slice_owl.csv";
-  evaluate_linalg  () |> Owl_io.write_file "linalg_owl.csv"
+  evaluate_linalg  () |> Owl_io.write_file "linalg_owl.csv" )
@@ -3,8 +3,28 @@
 import numpy as np
 import scipy.special as sp
 import scipy.linalg
-import time
+import scipy.ndimage
+import scipy.signal
+import argparse
+import collections
 import math
+import os
+import sys
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+import cachegrid
+import cachestate
+import checkpoint
+import clock
+import counters
+import memprof
+import noise
+import results
+import sweep
+from arena import Arena, layouts as arena_layouts
 
 # Unary vectorised math operations
 
@@ -27,6 +47,23 @@ fun_axis_arr_name = ["max", "sum", "prod", "cumprod", "cummax"]
 fun_axes_arr = [np.sum]
 fun_axes_arr_name = ["sum_reduce"]
 
+# In-place variants, writing into a preallocated `out` reused across samples,
+# like Owl's `_` ops (N.add_, N.abs_, ...); all are called as fn(..., out=out)
+
+def copy_(x, out): return np.copyto(out, x)
+def sort_(x, out):
+    out[...] = x
+    out.sort()
+def sigmoid_(x, out):
+    np.negative(x, out=out)
+    np.exp(out, out=out)
+    np.add(out, 1, out=out)
+    return np.divide(1, out, out=out)
+fun_arr_ = [copy_, np.abs, np.exp, np.log, np.sqrt, np.cbrt, np.sin, np.tan,
+  np.arcsin, np.sinh, np.arcsinh, np.round, sort_, sigmoid_]
+fun_arr_arr_ = fun_arr_arr
+fun_axis_arr_ = fun_axis_arr
+
 # Repeat operations
 
 def rep(x, axes):
@@ -44,188 +81,521 @@ fun_linalg = [matm, np.linalg.inv, np.linalg.eigvals, np.linalg.svd,
     scipy.linalg.lu, np.linalg.qr]
 fun_linalg_name = ["matmul", "inv", "eigvals", "svd", "lu", "qr"]
 
-# Timing functions
+# Batched linear algebra on stacks of matrices (B, m, n), each op with the
+# inputs it needs built from a uniform stack: square ones get well
+# conditioned symmetric positive definite matrices
+
+def spd(x):
+    n = x.shape[-1]
+    return (np.matmul(x, x.swapaxes(-1, -2).conj()) +
+        n * np.eye(n, dtype=x.dtype),)
+def rhs(x): return spd(x) + (np.ascontiguousarray(x[..., :1]),)
+def same(x): return (x,)
+def gram(x): return np.matmul(x.swapaxes(-1, -2), x)
+def svdvals(x): return np.linalg.svd(x, compute_uv=False)
+fun_batched = [gram, np.linalg.solve, np.linalg.cholesky, np.linalg.eigh,
+    np.linalg.inv, np.linalg.qr]
+fun_batched_name = ["matmul", "solve", "cholesky", "eigh", "inv", "qr"]
+fun_batched_in = [same, rhs, spd, spd, spd, same]
+
+# tall-skinny stacks: no square-only ops
+fun_tall = [gram, np.linalg.qr, svdvals]
+fun_tall_name = ["matmul", "qr", "svdvals"]
+
+# Indexing: gather and scatter with integer indices along an axis, boolean
+# masks, and views (whose creation is timed apart from their materialisation)
+
+def along(idx, axis): return (slice(None),) * axis + (idx,)
+def take(x, idx, axis, v): return np.take(x, idx, axis=axis)
+def fancy(x, idx, axis, v): return x[along(idx, axis)]
+def put(x, idx, axis, v): x[along(idx, axis)] = v
+def add_at(x, idx, axis, v): np.add.at(x, along(idx, axis), v)
+fun_gather = [take, fancy, put, add_at]
+fun_gather_name = ["take", "fancy", "put", "add_at"]
+fun_gather_writes = [False, False, True, True]
+
+def mask(x, m, axis): return x[m]
+def mask_put(x, m, axis): x[m] = 0
+def compress(x, m, axis): return np.compress(m, x, axis=axis)
+fun_mask = [mask, mask_put, compress]
+fun_mask_name = ["mask", "mask_put", "compress"]
+
+def bcast(x): return np.broadcast_to(x[:1], x.shape)
+def transpose(x): return x.T
+def step(x): return x[::2, ::3]
+def window(x): return np.lib.stride_tricks.sliding_window_view(x, 4, axis=1)
+fun_view = [bcast, transpose, step, window]
+fun_view_name = ["broadcast_to", "transpose", "step", "window"]
+
+# Convolution and pooling of NHWC image stacks, as Owl's conv2d: HWIO
+# kernels with "same" padding, pooling over "valid" windows. Each op comes
+# from NumPy stride tricks (im2col and GEMM, or a window view) and from
+# SciPy, whose filters give every output position: strided outputs are
+# subsampled from them
+
+def windows(x, k): return np.lib.stride_tricks.sliding_window_view(x, (k, k),
+    axis=(1, 2))
+
+def same_pad(x, k, stride):
+    pads = [(0, 0)]
+    for n in x.shape[1:3]:
+        p = max((-(-n // stride) - 1) * stride + k - n, 0)
+        pads.append((p // 2, p - p // 2))
+    return np.pad(x, pads + [(0, 0)])
+
+# the positions of a centred filter's output where the window fits
+def valid(y, k, stride):
+    a, b = k // 2, (k - 1) // 2
+    return y[:, a:y.shape[1] - b:stride, a:y.shape[2] - b:stride]
+
+def conv_im2col(x, w, stride):
+    k, _, c, o = w.shape
+    win = windows(same_pad(x, k, stride), k)[:, ::stride, ::stride]
+    cols = win.reshape(-1, c * k * k)
+    y = cols @ w.transpose(2, 0, 1, 3).reshape(c * k * k, o)
+    return y.reshape(win.shape[:3] + (o,))
+
+def conv_signal(x, w, stride):
+    xp = same_pad(x, w.shape[0], stride)
+    y = [scipy.signal.correlate(xp, w[None, ..., j], mode='valid')[..., 0]
+        for j in range(w.shape[3])]
+    return np.stack(y, axis=-1)[:, ::stride, ::stride]
+
+def conv_ndimage(x, w, stride):
+    k, _, c, o = w.shape
+    xp = same_pad(x, k, stride)
+    y = np.zeros(xp.shape[:3] + (o,), np.result_type(x, w))
+    for i in range(c):
+        for j in range(o):
+            y[..., j] += scipy.ndimage.correlate(xp[..., i],
+                w[None, :, :, i, j], mode='constant')
+    return valid(y, k, stride)
 
-def time_fun(fn):
-    start = time.time()
-    fn()
-    end = time.time()
-    return (end - start) * 1000
+def max_pool(x, k, stride):
+    return windows(x, k)[:, ::stride, ::stride].max(axis=(-2, -1))
+def avg_pool(x, k, stride):
+    return windows(x, k)[:, ::stride, ::stride].mean(axis=(-2, -1))
+def max_pool_ndimage(x, k, stride):
+    return valid(scipy.ndimage.maximum_filter(x, (1, k, k, 1)), k, stride)
+def avg_pool_ndimage(x, k, stride):
+    return valid(scipy.ndimage.uniform_filter(x, (1, k, k, 1)), k, stride)
 
+# Expression chains: several elementwise ops in a row, as production code
+# writes them (a full-size temporary per op), chained through out= into the
+# output ("sigmoid_", see sigmoid_ above), the same chain block by block in
+# cache-sized chunks, and numexpr when it is installed. Normalisation first
+# needs the mean and standard deviation, taken with one scratch buffer.
+
+def softplus(x): return np.log(1 + np.exp(x))
+def normalise(x): return (x - x.mean()) / x.std()
+poly_coef = (0.5, -2., 3., 1.)
+def poly(x):
+    a, b, c, d = poly_coef
+    return ((a * x + b) * x + c) * x + d
+
+def softplus_(x, out):
+    np.exp(x, out=out)
+    np.add(out, 1, out=out)
+    return np.log(out, out=out)
+def normalise_(x, out, m, s):
+    np.subtract(x, m, out=out)
+    return np.multiply(out, 1 / s, out=out)
+def poly_(x, out):
+    a, b, c, d = poly_coef
+    np.multiply(x, a, out=out)
+    np.add(out, b, out=out)
+    np.multiply(out, x, out=out)
+    np.add(out, c, out=out)
+    np.multiply(out, x, out=out)
+    return np.add(out, d, out=out)
+
+def moments(x, t, block):
+    m = x.mean()
+    ss = 0.
+    for lo in range(0, len(x), block):
+        d = np.subtract(x[lo:lo + block], m, out=t[:len(x[lo:lo + block])])
+        ss += np.dot(d, d)
+    return m, np.sqrt(ss / len(x))
+
+fun_expr = [sigmoid, softplus, normalise, poly]
+fun_expr_ = [sigmoid_, softplus_, normalise_, poly_]
+fun_expr_stats = [None, None, moments, None]
+fun_expr_ne = ["1 / (1 + exp(-x))", "log(1 + exp(x))", "(x - m) / s",
+    "((a * x + b) * x + c) * x + d"]
+fun_expr_name = ["sigmoid", "softplus", "normalise", "poly"]
+expr_strategies = ['', 'out', 'chunked'] + (['numexpr'] if numexpr else [])
+
+fun_conv = [conv_im2col, conv_signal, conv_ndimage]
+fun_conv_impl = ["im2col", "signal", "ndimage"]
+fun_pool = [max_pool, avg_pool, max_pool_ndimage, avg_pool_ndimage]
+fun_pool_name = ["max_pool2d", "avg_pool2d", "max_pool2d", "avg_pool2d"]
+fun_pool_impl = ["window", "window", "ndimage", "ndimage"]
+
+# Timing functions
 
 def remove_outlier(arr):
     fp = np.percentile(arr, 25)
     tp = np.percentile(arr, 75)
-    return filter(lambda x : (x >= fp) and (x <= tp), arr)
+    return [x for x in arr if (x >= fp) and (x <= tp)]
 
 
-def timing(fn, msg):
-    c = 30
-    times = []
-    for i in range(c):
-        t = fn()
-        times.append(t)
-    times = remove_outlier(times)
+# mean and std are taken without outliers; samples are the raw per-call times;
+# memory is filled by a separate, untimed pass when OP_EVAL_MEMORY is set,
+# and counters (hardware counts per call) likewise when OP_EVAL_COUNTERS is;
+# noise lists the disturbances seen in interleaved runs (see run_interleaved)
+Timing = collections.namedtuple('Timing',
+    ['mean', 'std', 'samples', 'inner', 'threads', 'memory', 'counters',
+    'noise'], defaults=[None])
+
+profile_memory = os.environ.get('OP_EVAL_MEMORY') == '1'
+profile_counters = os.environ.get('OP_EVAL_COUNTERS') == '1'
+
+
+def timing(g, msg, memory=False):
+    """Time g; its memory is profiled as well if asked or OP_EVAL_MEMORY."""
+    samples, inner = clock.measure(g)
+    times = remove_outlier(samples)
     m_time = np.mean(times)
-    s_time = np.std(times) 
-    print "| %s :\t mean = %.5f \t std = %.5f" % (msg, m_time, s_time)
-    return m_time, s_time
+    s_time = np.std(times)
+    print("| %s :\t mean = %.5f \t std = %.5f \t (%d x %d)" %
+        (msg, m_time, s_time, len(samples), inner))
+    memory = memprof.profile(g) if profile_memory or memory else None
+    hw = counters.profile(g, inner) if profile_counters else None
+    return Timing(m_time, s_time, samples, inner, sweep.current_threads(),
+        memory, hw)
+
+
+# Inputs are built once and shared across cells, see arena.py
+
+arena = Arena(os.environ.get('OP_EVAL_ARENA'))
+
+
+def uniform(sz, seed=0, dtype='float32', layout='C'):
+    return arena.get([sz], dtype, seed, layout=layout)
+
+
+def uniform_unpack(sz, seed=0, dtype='float32', layout='C', mutable=False):
+    return arena.get(sz, dtype, seed, mutable, layout)
 
 
-def uniform(sz):
-    a = np.random.rand(sz)
-    return a.astype('float32')
+# Every evalop takes the dtype and memory layout of its inputs (see arena.py)
 
+def evalop_arr_arr(fn, name, sz, **kw): 
+  inp1 = uniform(sz, 0, **kw)
+  inp2 = uniform(sz, 1, **kw)
+  def g(): return fn(inp1, inp2)
+  return timing(g, "%s (%d)" % (name, sz))
 
-def uniform_unpack(sz):
-    a = np.random.rand(*sz)
-    return a.astype('float32')
 
+def evalop_arr(fn, name, sz, **kw): 
+  inp = uniform(sz, **kw)
+  def g(): return fn(inp)
+  return timing(g, "%s (%d)" % (name, sz))
 
-def evalop_arr_arr(fn, name, sz): 
-  def f(): 
-    inp1 = uniform(sz)
-    inp2 = uniform(sz)
-    def g(): return fn(inp1, inp2)
-    return time_fun(g)
-  return timing(f, "%s (%d)" % (name, sz))
 
+def evalop_arr_(fn, name, sz, **kw):
+  inp = uniform(sz, **kw)
+  out = np.empty_like(inp)
+  def g(): return fn(inp, out=out)
+  return timing(g, "%s_ (%d)" % (name, sz))
 
-def evalop_arr(fn, name, sz): 
-  def f(): 
-    inp= uniform(sz)
+
+def evalop_arr_arr_(fn, name, sz, **kw):
+  inp1 = uniform(sz, 0, **kw)
+  inp2 = uniform(sz, 1, **kw)
+  out = np.empty_like(inp1)
+  def g(): return fn(inp1, inp2, out=out)
+  return timing(g, "%s_ (%d)" % (name, sz))
+
+
+def evalop_axis_arr(axis, fn, name, sz, **kw):
+    inp = uniform_unpack(sz, **kw)
+    def g(): return fn(inp, axis=axis)
+    return timing(g, "%s (axis=%d, %s)" % (name, axis, str(sz)))
+
+
+def evalop_axis_arr_(axis, fn, name, sz, **kw):
+    inp = uniform_unpack(sz, **kw)
+    out = fn(inp, axis=axis)
+    def g(): return fn(inp, axis=axis, out=out)
+    return timing(g, "%s_ (axis=%d, %s)" % (name, axis, str(sz)))
+
+
+def evalop_axes_arr(axis, fn, name, sz, **kw):
+    inp = uniform_unpack(sz, **kw)
+    def g(): return fn(inp, axis=axis)
+    return timing(g, "%s (axes=%s, %s)" % (name, str(axis), str(sz)))
+
+
+def evalop_repeat(axes, fn, name, sz, **kw): 
+    inp = uniform_unpack(sz, **kw)
+    def g() : return fn(inp, axes) 
+    return timing(g, "%s (axis=%s, %s)" % (name, str(axes), str(sz)))
+
+
+def evalop_slice(idx, idx_str, sz, **kw): 
+    inp = uniform_unpack(sz, **kw)
+    def g() : return inp[tuple(idx)].copy()
+    return timing(g, "%s (%s)" % ('get_slice', idx_str))
+
+
+def evalop_linalg(fn, name, sz, **kw): 
+    inp = uniform_unpack(sz, **kw)
     def g(): return fn(inp)
-    return time_fun(g)
-  return timing(f, "%s (%d)" % (name, sz))
+    return timing(g, "%s (%d*%d)" % (name, sz[0], sz[1]))
+
+
+# an NHWC input with as many output channels as input ones
+def evalop_conv(fn, name, impl, kernel, stride, sz, **kw):
+    inp = uniform_unpack(sz, **kw)
+    w = uniform_unpack([kernel, kernel, sz[3], sz[3]], 1, **kw)
+    def g(): return fn(inp, w, stride)
+    return timing(g, "%s[%s] (kernel=%d, stride=%d, %s)" % (name, impl,
+        kernel, stride, str(sz)))
+
+
+def evalop_pool(fn, name, impl, kernel, stride, sz, **kw):
+    inp = uniform_unpack(sz, **kw)
+    def g(): return fn(inp, kernel, stride)
+    return timing(g, "%s[%s] (kernel=%d, stride=%d, %s)" % (name, impl,
+        kernel, stride, str(sz)))
+
 
+# chunks of x, out and scratch together fill half of L2
+def expr_block(dtype):
+    l2 = cachegrid.caches()[:2][-1][1]
+    return max(1024, l2 // (6 * np.dtype(dtype).itemsize))
 
-def evalop_axis_arr(axis, fn, name, sz):
-    def f ():
-        inp = uniform_unpack(sz)
-        def g(): return fn(inp, axis=axis)
-        return time_fun(g)
-    return timing(f, "%s (axis=%d, %s)" % (name, axis, str(sz)))
 
+# peak memory is always taken, as saving it is what the strategies are for
+# the expression is passed whole, its kernels, numexpr string and the
+# polynomial coefficients, so that editing any of them invalidates its cells
+# (see checkpoint.py)
+def evalop_expr(fn, fn_, stats, ne, coef, name, strategy, sz, **kw):
+    x = uniform(sz, **kw)
+    out = np.empty(x.shape, x.dtype)
+    if strategy == '':
+        def g(): return fn(x)
+    elif strategy == 'out':
+        t = np.empty(x.shape, x.dtype) if stats else None
+        def g(): return fn_(x, out, *(stats(x, t, sz) if stats else ()))
+    elif strategy == 'chunked':
+        b = expr_block(x.dtype)
+        t = np.empty(min(b, sz), x.dtype) if stats else None
+        def g():
+            args = stats(x, t, b) if stats else ()
+            for lo in range(0, sz, b):
+                fn_(x[lo:lo + b], out[lo:lo + b], *args)
+            return out
+    else:
+        env = dict(zip('abcd', coef))
+        def g():
+            if stats:
+                env['m'], env['s'] = x.mean(), x.std()
+            env['x'] = x
+            return numexpr.evaluate(ne, local_dict=env)
+    name += '[%s]' % strategy if strategy else ''
+    return timing(g, "%s (%d)" % (name, sz), memory=True)
 
-def evalop_axes_arr(axis, fn, name, sz):
-    def f ():
-        inp = uniform_unpack(sz)
-        def g(): return fn(inp, axis=axis)
-        return time_fun(g)
-    return timing(f, "%s (axes=%s, %s)" % (name, str(axis), str(sz)))
 
+# count is the number of indices per element of the axis; "sorted" indices
+# walk memory forward, "random" ones jump (both may repeat)
+def indices(n, count, order, seed=2):
+    rng = np.random.RandomState(seed)
+    idx = rng.randint(0, n, max(1, int(round(count * n)))).astype(np.intp)
+    return np.sort(idx) if order == 'sorted' else idx
 
-def evalop_repeat(axes, fn, name, sz): 
-    def f(): 
-        inp = np.ones(sz)
-        def g() : return fn(inp, axes) 
-        return time_fun(g)
-    return timing(f, "%s (axis=%s, %s)" % (name, str(axes), str(sz)))
 
+def evalop_gather(fn, name, writes, count, order, axis, sz, **kw):
+    inp = uniform_unpack(sz, mutable=writes, **kw)
+    idx = indices(sz[axis], count, order)
+    v = np.take(inp, idx, axis=axis)
+    def g(): return fn(inp, idx, axis, v)
+    return timing(g, "%s (count=%gn, %s, axis=%d, %s)" % (name, count, order,
+        axis, str(sz)))
 
-def evalop_slice(idx, idx_str, sz): 
-    def f(): 
-        inp = uniform_unpack(sz)
-        def g() : return inp[idx].copy()
-        return time_fun(g)
-    return timing(f, "%s (%s)" % ('get_slice', idx_str))
 
+# a mask selecting a fraction sel of the elements (of the axis if given)
+def evalop_mask(fn, name, sel, axis, sz, **kw):
+    inp = uniform_unpack(sz, mutable=fn is mask_put, **kw)
+    rng = np.random.RandomState(2)
+    m = rng.rand(*(sz if axis is None else sz[axis:axis + 1])) < sel
+    def g(): return fn(inp, m, axis)
+    return timing(g, "%s (sel=%g, %s)" % (name, sel, str(sz)))
 
-def evalop_linalg(fn, name, sz): 
-    def f(): 
-        inp = uniform_unpack(sz)
+
+def evalop_view(fn, name, copy, sz, **kw):
+    inp = uniform_unpack(sz, **kw)
+    if copy:
+        def g(): return np.ascontiguousarray(fn(inp))
+    else:
         def g(): return fn(inp)
-        return time_fun(g)
-    return timing(f, "%s (%d*%d)" % (name, sz[0], sz[1]))
+    return timing(g, "%s%s (%s)" % (name, '' if copy else ' view', str(sz)))
 
 
-# Evaluate simple arr and arr_arr operations
+# one call on the whole stack, or one call per matrix from a Python loop
+def evalop_batched(fn, name, prep, loop, sz, **kw):
+    # a loop over one matrix is the whole-stack call again, minutes of it for
+    # the single large problems: left out like an unsupported dtype
+    if loop and sz[0] == 1:
+        raise TypeError("a single matrix has no loop")
+    inp = prep(uniform_unpack(sz, **kw))
+    if loop:
+        def g(): return [fn(*[a[i] for a in inp]) for i in range(sz[0])]
+    else:
+        def g(): return fn(*inp)
+    return timing(g, "%s%s (%s)" % (name, ' loop' if loop else '',
+        '*'.join(map(str, sz))))
 
-def evaluate_simple():
-    sz = [10, 100, 1000, 10000, 100000, 200000, 400000, 600000, 800000, 1000000]
-    sz_str = "10,,100,,1000,,1e4,,1e5,,2e5,,4e5,,6e5,,8e5,,1e6"
 
-    result_str = "," + sz_str + "\n"
-    for i in range(len(fun_arr)):
-        result_str += fun_arr_name[i] + ","
-        for j in range(len(sz)):
-            mu, std = evalop_arr(fun_arr[i], fun_arr_name[i], sz[j])
-            result_str += "%.4f, %.4f," % (mu, std)
-        result_str += "\n"
+# Suites
+#
+# A suite is a list of rows and a list of sizes. Each (row, size) cell is
+# independent and runs as evalop(*args, sz), so cells can be farmed out to
+# worker processes, see sweep.py. A row's label is its op and parameters
+# (e.g. "max(axis=0)"), which are also kept apart for the result store; rows
+# of the in-place suites have the variant "out" and Owl-style labels
+# ("max_(axis=0)"). Suites whose ops are multi-threaded through BLAS/LAPACK
+# are marked `threaded`.
+#
+# Any suite can also be swept over input dtypes, memory layouts and cache
+# states: a cell (suite, row, size, dtype, layout, cache) runs the row on
+# inputs of that dtype (None for the row's own) and layout, with the caches
+# warm or flushed before every sample (see cachestate.py). Ops a dtype does
+# not support (cbrt of complex, in-place exp of int32, ...) are reported and
+# left out.
+
+Suite = collections.namedtuple('Suite', ['name', 'sizes', 'rows', 'threaded'])
+Row = collections.namedtuple('Row',
+    ['label', 'op', 'param', 'dtype', 'variant', 'evalop', 'args'])
+
+
+# OP_EVAL_SIZES=cache replaces the fixed size lists below by grids dense
+# around the cache boundaries of the host (see cachegrid.py), starting at the
+# smallest fixed size
+
+cache_sizes = os.environ.get('OP_EVAL_SIZES') == 'cache'
+
+
+def sizes(fixed, ndim=1, arity=(1,), out=True, hi=None):
+    if not cache_sizes:
+        return fixed
+    lo = int(np.prod(fixed[0]))
+    if ndim == 1:
+        return cachegrid.grid('float32', arity, out, lo, hi)
+    return cachegrid.shapes(ndim, 'float32', arity, out, lo, hi=hi)
+
 
+def scaled(fixed, lo, arity=(1,), out=True, hi=None):
+    """Like sizes, for shapes that are not hypercubes: each fixed shape is
+    scaled along every axis to the sizes of the grid from lo elements."""
+    if not cache_sizes:
+        return fixed
+    out_sz = []
+    for base in fixed:
+        for n in cachegrid.grid('float32', arity, out, lo, hi):
+            f = (n / float(np.prod(base))) ** (1. / len(base))
+            s = [max(2, int(round(d * f))) for d in base]
+            if s not in out_sz:
+                out_sz.append(s)
+    return out_sz
+
+
+def row(op, param, evalop, args, dtype='float32', variant=''):
+    name = op + '_' if variant == 'out' else op
+    label = "%s(%s)" % (name, param) if param else name
+    if variant not in ('', 'out'):
+        label += '[%s]' % variant
+    return Row(label, op, param, dtype, variant, evalop, args)
+
+
+# Simple arr and arr_arr operations
+
+def suite_simple():
+    sz = sizes([10, 100, 1000, 10000, 100000, 200000, 400000, 600000, 800000,
+        1000000], arity=(1, 2))
+    rows = []
+    for i in range(len(fun_arr)):
+        rows.append(row(fun_arr_name[i], '', evalop_arr,
+            (fun_arr[i], fun_arr_name[i])))
     for i in range(len(fun_arr_arr)):
-        result_str += fun_arr_arr_name[i] + ","
-        for j in range(len(sz)):
-            mu, std = evalop_arr_arr(fun_arr_arr[i], fun_arr_arr_name[i], sz[j])
-            result_str += "%.4f, %.4f," % (mu, std)
-        result_str += "\n"
+        rows.append(row(fun_arr_arr_name[i], '', evalop_arr_arr,
+            (fun_arr_arr[i], fun_arr_arr_name[i])))
+    return Suite('simple', sz, rows, False)
 
-    return result_str
+def suite_simple_out():
+    sz = suite_simple().sizes
+    rows = []
+    for i in range(len(fun_arr_)):
+        rows.append(row(fun_arr_name[i], '', evalop_arr_,
+            (fun_arr_[i], fun_arr_name[i]), variant='out'))
+    for i in range(len(fun_arr_arr_)):
+        rows.append(row(fun_arr_arr_name[i], '', evalop_arr_arr_,
+            (fun_arr_arr_[i], fun_arr_arr_name[i]), variant='out'))
+    return Suite('simple_out', sz, rows, False)
 
-# Evaluate axis operations
+# Axis operations
 
-def evaluate_axis():
-  sz = [[10, 10, 10, 10], [20, 20, 20, 20], [30, 30, 30, 30],
-    [40, 40, 40, 40], [50, 50, 50, 50], [60, 60, 60, 60]]
-  sz_str = "10,,20,,30,,40,,50,,60"
+def suite_axis():
+  sz = sizes([[10, 10, 10, 10], [20, 20, 20, 20], [30, 30, 30, 30],
+    [40, 40, 40, 40], [50, 50, 50, 50], [60, 60, 60, 60]], 4)
   axis = [0,3]
-  result_str = "," + sz_str + "\n"
+  rows = []
   for i in range(len(fun_axis_arr)):
     for k in range(len(axis)):
-      result_str += "%s(axis=%d)," % (fun_axis_arr_name[i], axis[k])
-      for j in range(len(sz)):
-        mu, std = evalop_axis_arr(axis[k], fun_axis_arr[i], 
-            fun_axis_arr_name[i], sz[j])
-        result_str += "%.4f, %.4f," % (mu, std)
-      result_str += "\n"
-  return result_str
-
-# Evaluate axes operations
-
-def evaluate_axes():
-  sz = [[10, 10, 10, 10], [20, 20, 20, 20], [30, 30, 30, 30],
+      rows.append(row(fun_axis_arr_name[i], "axis=%d" % axis[k],
+        evalop_axis_arr, (axis[k], fun_axis_arr[i], fun_axis_arr_name[i])))
+  return Suite('axis', sz, rows, False)
+
+
+def suite_axis_out():
+  sz = suite_axis().sizes
+  axis = [0,3]
+  rows = []
+  for i in range(len(fun_axis_arr_)):
+    for k in range(len(axis)):
+      rows.append(row(fun_axis_arr_name[i], "axis=%d" % axis[k],
+        evalop_axis_arr_, (axis[k], fun_axis_arr_[i], fun_axis_arr_name[i]),
+        variant='out'))
+  return Suite('axis_out', sz, rows, False)
+
+# Axes operations
+
+def suite_axes():
+  sz = sizes([[10, 10, 10, 10], [20, 20, 20, 20], [30, 30, 30, 30],
     [40, 40, 40, 40], [50, 50, 50, 50], [60, 60, 60, 60],
-    [70, 70, 70, 70]]
-  sz_str = "10,,20,,30,,40,,50,,60,,70"
+    [70, 70, 70, 70]], 4, out=False)
   axes = [(0,3), (0,2)]
-  result_str = "," + sz_str + "\n"
+  rows = []
   for i in range(len(fun_axes_arr)):
     for k in range(len(axes)):
       axes_str = '*'.join(map(str, axes[k]))
-      result_str += "%s(axes=%s)," % (fun_axes_arr_name[i], axes_str)
-      for j in range(len(sz)):
-        mu, std = evalop_axes_arr(axes[k], fun_axes_arr[i], 
-            fun_axes_arr_name[i], sz[j])
-        result_str += "%.4f, %.4f," % (mu, std)
-      result_str += "\n"
-  return result_str
+      rows.append(row(fun_axes_arr_name[i], "axes=%s" % axes_str,
+        evalop_axes_arr, (axes[k], fun_axes_arr[i], fun_axes_arr_name[i])))
+  return Suite('axes', sz, rows, False)
 
 
-# Evaluate repeat operations
+# Repeat operations
 
-def evaluate_repeat(): 
-  sz = [[10, 10, 10, 10], [15, 15, 15, 15], [20, 20, 20, 20], 
-    [25, 25, 25, 25], [30, 30, 30, 30], [35, 35, 35, 35]] 
-  sz_str = "10,,15,,20,,25,,30,,35"
+def suite_repeat(): 
+  # outputs are up to 27 times the input, hence the cap
+  sz = sizes([[10, 10, 10, 10], [15, 15, 15, 15], [20, 20, 20, 20], 
+    [25, 25, 25, 25], [30, 30, 30, 30], [35, 35, 35, 35]], 4, out=False,
+    hi=4 * 35 ** 4)
   axes = [[1,1,1,5], [1,4,4,1], [3,3,3,1]]
-
-  result_str = "," + sz_str + "\n"
+  rows = []
   for i in range(len(fun_repeat)):
       for k in range(len(axes)):
         axes_str = '*'.join(map(str, axes[k]))
-        result_str +=  "%s(axes=%s),"  % (fun_repeat_name[i], axes_str)
-        for j in range(len(sz)):
-            mu, std = evalop_repeat(axes[k], fun_repeat[i], fun_repeat_name[i], sz[j])
-            result_str += "%.4f, %.4f," % (mu, std)
-        result_str += "\n"
-  return result_str
+        rows.append(row(fun_repeat_name[i], "axes=%s" % axes_str,
+          evalop_repeat, (axes[k], fun_repeat[i], fun_repeat_name[i])))
+  return Suite('repeat', sz, rows, False)
 
 
-# Evaluate repeat operations
+# Slicing operations
 
-def evaluate_slicing (): 
-    sz = [[10, 300, 3000], [3000, 300, 10]]
-    sz_str = "10*300*3000,,3000*300*10"
+def suite_slicing (): 
+    sz = scaled([[10, 300, 3000], [3000, 300, 10]], 1000)
     index = [
         [slice(0, -1), slice(None, None), slice(None, None)],
         [slice(-1, 0, -1), slice(0, 1), slice(None, None)],
@@ -240,44 +610,532 @@ def evaluate_slicing ():
         "[[-1;0]; [-1;0]; [0]]", "[[-1]; [-1;0];[]]",
         "[[]; [-1;0]; []]", "[[]; [0;-1]; [-1;0]]",
         "[[]; [-1;0]; [0;1]]", "[[]; [0;-1]; [-1;0;-2]]"]
-
-    result_str = "," + sz_str + "\n"
+    rows = []
     for i in range(len(index)):
-        result_str += "%s(index=%s)," % ("get_slice", index_str[i])
-        for j in range(len(sz)):
-            mu, std = evalop_slice(index[i], index_str[i], sz[j]) #!
-            result_str += "%.4f, %.4f," % (mu, std)  
-        result_str += "\n"
-    return result_str
+        rows.append(row("get_slice", "index=%s" % index_str[i],
+            evalop_slice, (index[i], index_str[i])))
+    return Suite('slice', sz, rows, False)
 
 
-# Evaluate linear algebra operations
+# Linear algebra operations
 
-def evaluate_linalg ():
-    sz = [[10, 10], [50, 50], [100, 100],
+def suite_linalg ():
+    # capped at the largest fixed size: O(n^3) ops do not need DRAM sizes
+    sz = sizes([[10, 10], [50, 50], [100, 100],
         [150, 150], [200, 200], [300, 300], [400, 400],
-        [600, 600], [800, 800], [1000, 1000]]
-    sz_str = "10,,50,,100,,150,,200,,300,,400,,600,,800,,1000"
-
-    result_str = "," + sz_str + "\n"
+        [600, 600], [800, 800], [1000, 1000]], 2, hi=1000 * 1000)
+    rows = []
     for i in range(len(fun_linalg)):
-        result_str += "%s," % fun_linalg_name[i]
-        for j in range(len(sz)):
-            mu, std = evalop_linalg(fun_linalg[i],
-                fun_linalg_name[i], sz[j])
-            result_str += "%.4f, %.4f," % (mu, std)
-        result_str += "\n"
-    return result_str
-
-
-def write_file(fname, output_str):
-    with open(fname, "w") as csv:
-        csv.write(output_str)
-
-
-write_file('simple_np.csv', evaluate_simple())
-write_file('axis_np.csv',   evaluate_axis())
-write_file('axes_np.csv',   evaluate_axes())
-write_file('repeat_np.csv', evaluate_repeat())
-write_file('slice_np.csv',  evaluate_slicing())
-write_file('linalg_np.csv', evaluate_linalg())
+        rows.append(row(fun_linalg_name[i], '', evalop_linalg,
+            (fun_linalg[i], fun_linalg_name[i])))
+    return Suite('linalg', sz, rows, True)
+
+
+# Batched linear algebra: batch count x matrix size, up to 4M elements, plus a
+# few single large problems; rows of the variant "loop" make one call per
+# matrix ("matmul[loop]"), to show where per-call overhead dominates
+
+def stacks(batch, shapes, cap=1 << 22):
+    """Stacks of each matrix shape; with OP_EVAL_SIZES=cache, the batch
+    counts put the stacks on the grid of sizes instead."""
+    if cache_sizes:
+        grid = cachegrid.grid('float32', 1, True, 1, cap)
+        return [[b] + s for s in shapes
+            for b in sorted(set(max(1, n // (s[0] * s[1])) for n in grid))
+            if b * s[0] * s[1] <= cap]
+    return [[b] + s for b in batch for s in shapes if b * s[0] * s[1] <= cap]
+
+
+def suite_batched():
+    sz = stacks([1, 8, 64, 512, 4096],
+        [[n, n] for n in [2, 4, 8, 16, 32, 64, 128, 256]])
+    sz += [[1, 2048, 2048], [1, 4096, 4096], [1, 8192, 8192]]
+    rows = []
+    for loop in [False, True]:
+        for i in range(len(fun_batched)):
+            rows.append(row(fun_batched_name[i], '', evalop_batched,
+                (fun_batched[i], fun_batched_name[i], fun_batched_in[i], loop),
+                variant='loop' if loop else ''))
+    return Suite('batched', sz, rows, True)
+
+
+def suite_tall():
+    sz = stacks([1, 64, 1024],
+        [[k * n, n] for n in [4, 16, 64] for k in [16, 256]])
+    sz += [[1, 65536, 64]]
+    rows = []
+    for loop in [False, True]:
+        for i in range(len(fun_tall)):
+            rows.append(row(fun_tall_name[i], '', evalop_batched,
+                (fun_tall[i], fun_tall_name[i], same, loop),
+                variant='loop' if loop else ''))
+    return Suite('tall', sz, rows, True)
+
+
+# Indexing: gather/scatter by index count, order and axis, masks by
+# selectivity, and views both created only (variant "view") and materialised
+
+def suite_index():
+    sz = sizes([[100, 100], [300, 300], [1000, 1000], [3000, 3000]], 2)
+    rows = []
+    for i in range(len(fun_gather)):
+        for count in [0.01, 0.1, 1]:
+            for order in ['sorted', 'random']:
+                for axis in [0, 1]:
+                    rows.append(row(fun_gather_name[i],
+                        "count=%gn,order=%s,axis=%d" % (count, order, axis),
+                        evalop_gather, (fun_gather[i], fun_gather_name[i],
+                        fun_gather_writes[i], count, order, axis)))
+    for i in range(len(fun_mask)):
+        for sel in [0.01, 0.1, 0.5, 0.9]:
+            for axis in ([None] if fun_mask[i] is not compress else [0, 1]):
+                param = "sel=%g" % sel
+                if axis is not None:
+                    param += ",axis=%d" % axis
+                rows.append(row(fun_mask_name[i], param, evalop_mask,
+                    (fun_mask[i], fun_mask_name[i], sel, axis)))
+    for copy in [False, True]:
+        for i in range(len(fun_view)):
+            rows.append(row(fun_view_name[i], '', evalop_view,
+                (fun_view[i], fun_view_name[i], copy),
+                variant='' if copy else 'view'))
+    return Suite('index', sz, rows, False)
+
+
+# Expression chains: one row per expression and strategy (the variant: ''
+# for the naive one, "out", "chunked", "numexpr"), on inputs up to 10M
+
+def suite_expr():
+    sz = sizes([10, 100, 1000, 10000, 100000, 1000000, 10000000])
+    rows = []
+    for strategy in expr_strategies:
+        for k in range(len(fun_expr)):
+            rows.append(row(fun_expr_name[k], '', evalop_expr, (fun_expr[k],
+                fun_expr_[k], fun_expr_stats[k], fun_expr_ne[k], poly_coef,
+                fun_expr_name[k], strategy), variant=strategy))
+    return Suite('expr', sz, rows, False)
+
+
+# Convolution and pooling: single-channel images of growing size, as in
+# crosspoint.ml, then batches of multi-channel ones; one row per kernel size,
+# stride and implementation (the variant)
+
+def suite_conv():
+    sz = [[1] + s + [1] for s in sizes([[n, n] for n in [16, 32, 64, 128, 256,
+        512, 1024]], 2, hi=1024 * 1024)]
+    sz += [[b, n, n, c] for b in [1, 8, 32] for n in [32, 64]
+        for c in [3, 16, 32] if b * n * n * c <= 1 << 20]
+    rows = []
+    for kernel in [3, 5]:
+        for stride in [1, 2]:
+            param = "kernel=%d,stride=%d" % (kernel, stride)
+            for i in range(len(fun_conv)):
+                rows.append(row("conv2d", param, evalop_conv, (fun_conv[i],
+                    "conv2d", fun_conv_impl[i], kernel, stride),
+                    variant=fun_conv_impl[i]))
+            for i in range(len(fun_pool)):
+                rows.append(row(fun_pool_name[i], param, evalop_pool,
+                    (fun_pool[i], fun_pool_name[i], fun_pool_impl[i], kernel,
+                    stride), variant=fun_pool_impl[i]))
+    return Suite('conv', sz, rows, True)
+
+
+suites = collections.OrderedDict([
+    ('simple', suite_simple),
+    ('simple_out', suite_simple_out),
+    ('axis',   suite_axis),
+    ('axis_out', suite_axis_out),
+    ('axes',   suite_axes),
+    ('repeat', suite_repeat),
+    ('slice',  suite_slicing),
+    ('linalg', suite_linalg),
+    ('batched', suite_batched),
+    ('tall', suite_tall),
+    ('index', suite_index),
+    ('conv', suite_conv),
+    ('expr', suite_expr)])
+
+
+# Tags select rows by kind, next to their op names and labels
+
+tags = collections.OrderedDict([
+    ('unary',     fun_arr_name),
+    ('binary',    fun_arr_arr_name),
+    ('reduction', fun_axis_arr_name[:3] + fun_axes_arr_name),
+    ('scan',      fun_axis_arr_name[3:]),
+    ('repeat',    fun_repeat_name),
+    ('slice',     ['get_slice']),
+    ('gather',    fun_gather_name),
+    ('mask',      fun_mask_name),
+    ('views',     fun_view_name),
+    ('conv',      ['conv2d']),
+    ('pool',      ['max_pool2d', 'avg_pool2d']),
+    ('expr',      fun_expr_name),
+    ('linalg',    fun_linalg_name + fun_batched_name + fun_tall_name)])
+
+
+def row_tags(r):
+    t = [k for k, ops in tags.items() if r.op in ops]
+    return t + [r.variant] if r.variant else t
+
+
+def selected(r, names):
+    return not names or any(n in names for n in [r.op, r.label] + row_tags(r))
+
+
+# Every finished cell is checkpointed in OP_EVAL_CHECKPOINT, if set, and
+# found there by later runs unless OP_EVAL_FRESH is set (see checkpoint.py)
+
+store = None
+if os.environ.get('OP_EVAL_CHECKPOINT'):
+    store = checkpoint.Store(os.environ['OP_EVAL_CHECKPOINT'])
+fresh = os.environ.get('OP_EVAL_FRESH') == '1'
+
+
+def cell_spec(cell):
+    suite, i, j = cell[:3]
+    # cells of older runs may leave out the cache state, or layout as well
+    dtype, layout, cache = cell[3:] + (None, 'C', 'warm')[len(cell) - 3:]
+    s = suites[suite]()
+    r = s.rows[i]
+    return r, s.sizes[j], dtype or r.dtype, layout, cache
+
+
+def cell_key(cell):
+    r, sz, dtype, layout, cache = cell_spec(cell)
+    return checkpoint.key(cell[0], r, sz, dtype, layout, cache)
+
+
+def cached(cell):
+    """Timing of a cell from the checkpoint store, None if not there."""
+    if store is None:
+        return None
+    t = store.get(cell_key(cell))
+    if t is None or (profile_memory and t['memory'] is None):
+        return None
+    # counters are only asked again where they may exist
+    t.setdefault('counters', None)
+    if profile_counters and t['counters'] is None and counters.available():
+        return None
+    t['samples'] = np.array(t['samples'])
+    return Timing(**t)
+
+
+def run_cell(cell):
+    t = None if fresh else cached(cell)
+    if t is not None:
+        return t
+    r, sz, dtype, layout, cache = cell_spec(cell)
+    try:
+        with cachestate.mode(cache):
+            t = r.evalop(*(r.args + (sz,)), dtype=dtype, layout=layout)
+    except TypeError as e:
+        print("| %s (%s, %s) unsupported: %s" % (r.label, dtype, layout, e))
+        return None
+    if store is not None:
+        store.put(cell_key(cell), t._asdict(), suite=cell[0], label=r.label,
+            size=sz, dtype=dtype, layout=layout, cache=cache)
+    return t
+
+
+# OP_EVAL_ROUNDS > 1 interleaves the cells of a suite: every cell is measured
+# in that many rounds of a share of its samples, all (cell, round) pairs in a
+# shuffled order, so that a slow spell of the host is spread over many cells
+# instead of biasing the few that ran through it. Each round is followed by a
+# noise check (see noise.py); rounds run while the host was disturbed are run
+# again, up to OP_EVAL_RETRIES times, and the cells still disturbed keep the
+# reasons in their `noise` column.
+
+rounds = int(os.environ.get('OP_EVAL_ROUNDS', '1'))
+retries = int(os.environ.get('OP_EVAL_RETRIES', '2'))
+seed = int(os.environ.get('OP_EVAL_SEED', '0'))
+monitor = None
+noise_log = []
+
+
+def run_round(task):
+    """(Timing, snapshot or None) of one round of a cell."""
+    global monitor
+    if monitor is None:
+        monitor = noise.Monitor()
+    cell, _ = task
+    r, sz, dtype, layout, cache = cell_spec(cell)
+    saved = clock.min_samples, clock.max_samples, clock.max_cell_ns
+    # at least 3 samples, as remove_outlier keeps none of 2
+    clock.min_samples = max(3, -(-clock.min_samples // rounds))
+    clock.max_samples = max(3, -(-clock.max_samples // rounds))
+    clock.max_cell_ns = clock.max_cell_ns // rounds
+    try:
+        with cachestate.mode(cache):
+            t = r.evalop(*(r.args + (sz,)), dtype=dtype, layout=layout)
+    except TypeError as e:
+        print("| %s (%s, %s) unsupported: %s" % (r.label, dtype, layout, e))
+        return None, None
+    finally:
+        clock.min_samples, clock.max_samples, clock.max_cell_ns = saved
+    reasons, snap = monitor.check()
+    if reasons:
+        print("| disturbed: %s" % ', '.join(reasons))
+    return t._replace(noise=reasons), snap
+
+
+def merge(ts):
+    samples = np.concatenate([t.samples for t in ts])
+    times = remove_outlier(samples)
+    reasons = sorted(set(x for t in ts for x in t.noise))
+    return Timing(np.mean(times), np.std(times), samples,
+        max(t.inner for t in ts), ts[0].threads, ts[0].memory, ts[0].counters,
+        reasons)
+
+
+def run_interleaved(cells, runner, threaded):
+    hits = {}
+    if store is not None and not fresh:
+        hits = runner(cached, cells, threaded)
+    cells = [c for c in cells if hits.get(c) is None]
+    tasks = [(c, k) for k in range(rounds) for c in cells]
+    rng = np.random.RandomState(seed)
+    done = {}
+    for attempt in range(retries + 1):
+        order = [tasks[i] for i in rng.permutation(len(tasks))]
+        for task, (t, snap) in runner(run_round, order, threaded).items():
+            done[task] = t
+            if snap is not None:
+                noise_log.append(snap)
+        tasks = [t for t in tasks if done[t] is not None and done[t].noise]
+        if not tasks or attempt == retries:
+            break
+        print("| %d disturbed rounds, measuring them again" % len(tasks))
+
+    timings = dict((c, t) for c, t in hits.items() if t is not None)
+    keys = runner(cell_key, cells, threaded) if store is not None else {}
+    for c in cells:
+        ts = [done[(c, k)] for k in range(rounds)]
+        if any(t is None for t in ts):
+            continue
+        timings[c] = merge(ts)
+        if store is not None:
+            r, sz, dtype, layout, cache = cell_spec(c)
+            store.put(keys[c], timings[c]._asdict(), suite=c[0],
+                label=r.label, size=sz, dtype=dtype, layout=layout,
+                cache=cache)
+    return timings
+
+
+# The call a cell times, set up but not timed, for callers that drive it
+# themselves (e.g. ../openmp/throughput.py)
+
+def cell_fn(cell):
+    global timing
+    r, sz, dtype, layout, cache = cell_spec(cell)
+    saved, got = timing, []
+    timing = lambda g, msg, memory=False: got.append(g)
+    try:
+        r.evalop(*(r.args + (sz,)), dtype=dtype, layout=layout)
+    finally:
+        timing = saved
+    return got[0]
+
+
+# Run the row `label` of a suite at a size that is not on its list
+
+def run_at(suite, label, sz):
+    for r in suites[suite]().rows:
+        if r.label == label:
+            return r.evalop(*(r.args + (sz,)))
+    raise KeyError("no op %s in suite %s" % (label, suite))
+
+
+# Evaluate a suite, cell by cell, into result records (see results.py).
+# Only the rows selected by `ops` (names, labels or tags) are measured; the
+# others are taken from the checkpoint store where they are found there.
+
+def evaluate(suite, runner=sweep.serial, dtypes=(None,), layouts=('C',),
+        ops=None, caches=('warm',)):
+    s = suites[suite]()
+    cells = [(suite, i, j, d, l, c)
+        for c in caches for d in dtypes for l in layouts
+        for i in range(len(s.rows)) for j in range(len(s.sizes))]
+    todo = [c for c in cells if selected(s.rows[c[1]], ops)]
+    if rounds > 1:
+        timings = run_interleaved(todo, runner, s.threaded)
+    else:
+        timings = runner(run_cell, todo, s.threaded)
+    if store is not None and len(todo) < len(cells):
+        # looked up by the runner, so that keys see the same thread limits
+        timings.update(runner(cached,
+            [c for c in cells if c not in timings], s.threaded))
+    arena.clear()
+
+    records = []
+    for c in cells:
+        if timings.get(c) is None:
+            continue
+        r = s.rows[c[1]]
+        records.append(results.record(suite, r.op, r.param, s.sizes[c[2]],
+            c[3] or r.dtype, 'numpy', timings[c], r.variant, c[4], c[5]))
+    return records
+
+
+# Line protocol spoken with orchestrate.py, like op_eval.ml and op_eval.jl:
+# "ready numpy", then for every request
+#   cell <suite> <op> <param> <shape d0xd1..> <warmup> <samples> <min_ms>
+# (tab-separated) the answer "ok <inner> <ms per call>..." or "err <why>",
+# until "quit" or the end of input.
+
+def serve(inp=sys.stdin, out=sys.stdout):
+    sys.stdout = open(os.devnull, 'w')      # progress lines of timing()
+    out.write("ready\tnumpy\n")
+    out.flush()
+    for line in inp:
+        f = line.rstrip('\n').split('\t')
+        if f[0] == 'quit':
+            break
+        try:
+            suite, op, param, shape = f[1:5]
+            clock.warmup = int(f[5])
+            clock.min_samples = clock.max_samples = int(f[6])
+            clock.min_sample_ns = float(f[7]) * 1e6
+            s = suites[suite]()
+            r = [r for r in s.rows
+                if r.op == op and r.param == param and r.variant == ''][0]
+            sz = [int(d) for d in shape.split('x')]
+            if np.isscalar(s.sizes[0]):
+                sz = sz[0]
+            t = r.evalop(*(r.args + (sz,)))
+            out.write("ok\t%d\t%s\n" % (t.inner,
+                '\t'.join('%.6f' % x for x in t.samples)))
+        except Exception as e:
+            out.write("err\t%s\n" % repr(e).replace('\n', ' '))
+        out.flush()
+
+
+def evaluate_simple(runner=sweep.serial, **kw):
+    return evaluate('simple', runner, **kw)
+def evaluate_axis(runner=sweep.serial, **kw):
+    return evaluate('axis', runner, **kw)
+def evaluate_axes(runner=sweep.serial, **kw):
+    return evaluate('axes', runner, **kw)
+def evaluate_repeat(runner=sweep.serial, **kw):
+    return evaluate('repeat', runner, **kw)
+def evaluate_slicing(runner=sweep.serial, **kw):
+    return evaluate('slice', runner, **kw)
+def evaluate_linalg(runner=sweep.serial, **kw):
+    return evaluate('linalg', runner, **kw)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Evaluate core NumPy operations.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='worker processes, each pinned to its own core with one BLAS '
+             'thread; 1 runs every cell in this process (default)')
+    parser.add_argument('--counters', action='store_true',
+        help='also record hardware counters (cycles, instructions, LLC, '
+             'branch and dTLB misses) per call, where perf_event_open '
+             'allows (see counters.py)')
+    parser.add_argument('--memory', action='store_true',
+        help='also record peak and allocated memory of every cell, in a '
+             'separate pass after its timing (see memprof.py)')
+    parser.add_argument('--threaded', choices=['pinned', 'exclusive'],
+        default='exclusive',
+        help='how to run multi-threaded suites (linalg) when jobs > 1: '
+             'pinned like every other cell, or one cell at a time on the '
+             'whole machine (default)')
+    parser.add_argument('--sizes', choices=['fixed', 'cache'],
+        default=os.environ.get('OP_EVAL_SIZES', 'fixed'),
+        help='fixed size lists (default), or grids around the cache '
+             'boundaries of this host (see cachegrid.py)')
+    parser.add_argument('--dtype', default=None,
+        help='comma-separated input dtypes to sweep, e.g. '
+             'float32,float64,complex64,int32 (default: each row\'s own)')
+    parser.add_argument('--layout', default='C',
+        help='comma-separated input layouts to sweep, among %s (default C)'
+             % ','.join(arena_layouts))
+    parser.add_argument('--cache', default='warm',
+        help='comma-separated cache states to sweep, among %s: inputs '
+             'cached, data caches or TLBs flushed before every sample '
+             '(default warm; see cachestate.py)' % ','.join(cachestate.states))
+    parser.add_argument('-s', '--suite', action='append', choices=suites,
+        help='suites to run (repeatable; default all)')
+    parser.add_argument('--op', action='append',
+        help='rows to run, by op name, label or tag (repeatable; default '
+             'all); tags: %s' % ', '.join(list(tags) +
+                ['out', 'loop', 'view'] + fun_conv_impl + ['window'] +
+                expr_strategies[2:]))
+    parser.add_argument('--checkpoint', metavar='DIR',
+        default=os.environ.get('OP_EVAL_CHECKPOINT', 'cells'),
+        help='directory where every finished cell is kept, and found by '
+             'later runs (default ./cells); empty to disable')
+    parser.add_argument('--fresh', action='store_true',
+        help='measure the selected cells again even if checkpointed')
+    parser.add_argument('--rounds', type=int, default=rounds,
+        help='measure every cell in this many rounds, all cells of a suite '
+             'in a shuffled order, and check the host for noise after each '
+             '(see noise.py); 1 runs the cells in order (default)')
+    parser.add_argument('--retries', type=int, default=retries,
+        help='times rounds run while the host was disturbed are run again '
+             '(default 2)')
+    parser.add_argument('--seed', type=int, default=seed,
+        help='seed of the order of the rounds')
+    parser.add_argument('--list', action='store_true',
+        help='list the suites and their rows with tags, and exit')
+    parser.add_argument('--serve', action='store_true',
+        default=os.environ.get('OP_EVAL_SERVE') == '1',
+        help='measure cells asked for on stdin, for orchestrate.py')
+    args = parser.parse_args()
+    if args.serve:
+        serve()
+        raise SystemExit
+    if args.list:
+        for name, f in suites.items():
+            for r in f().rows:
+                print("%-10s %-32s %s" % (name, r.label,
+                    ','.join(row_tags(r))))
+        raise SystemExit
+    if args.counters:
+        os.environ['OP_EVAL_COUNTERS'] = '1'
+        profile_counters = True
+        for name, err in sorted(counters.shared().errors.items()):
+            print("| counter %s unavailable: %s" % (name, err))
+    if args.memory:
+        # through the environment, so that sweep workers see it as well
+        os.environ['OP_EVAL_MEMORY'] = '1'
+        profile_memory = True
+    os.environ['OP_EVAL_SIZES'] = args.sizes
+    cache_sizes = args.sizes == 'cache'
+    os.environ['OP_EVAL_CHECKPOINT'] = args.checkpoint
+    store = checkpoint.Store(args.checkpoint) if args.checkpoint else None
+    if args.fresh:
+        os.environ['OP_EVAL_FRESH'] = '1'
+        fresh = True
+
+    for k, v in [('ROUNDS', args.rounds), ('RETRIES', args.retries),
+            ('SEED', args.seed)]:
+        os.environ['OP_EVAL_' + k] = str(v)
+    rounds, retries, seed = args.rounds, args.retries, args.seed
+
+    runner = sweep.serial
+    if args.jobs > 1:
+        runner = sweep.Runner(args.jobs, args.threaded == 'exclusive')
+    dtypes = args.dtype.split(',') if args.dtype else [None]
+    layouts = args.layout.split(',')
+    for l in layouts:
+        if l not in arena_layouts:
+            parser.error("unknown layout %s" % l)
+    caches = args.cache.split(',')
+    for c in caches:
+        if c not in cachestate.states:
+            parser.error("unknown cache state %s" % c)
+    meta = results.host_meta()
+    if rounds > 1:
+        noise_log.append(noise.snapshot())
+        for w in noise.warnings(noise_log[0]):
+            print("| warning: %s" % w)
+        meta['noise'] = noise_log
+    for suite in args.suite or suites:
+        s = suites[suite]()
+        if not any(selected(r, args.op) for r in s.rows):
+            continue
+        results.save(suite + '_np.npz', evaluate(suite, runner, dtypes,
+            layouts, args.op, caches), meta)
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+
+"""
+Run op_eval.py, op_eval.ml and op_eval.jl side by side on one spec.
+
+The spec (spec.json) lists suites, each with its input shapes and its ops
+with their parameters, and a sample policy: warmup samples, samples per
+cell, the shortest sample (calls are repeated within a sample up to it) and
+the number of rounds the samples of a cell are split into. Every library's
+script is started once with OP_EVAL_SERVE=1 and asked for cells over a line
+protocol (see `serve` in op_eval.py); all (library, cell, round) requests
+are shuffled together and sent one at a time, so that drift, thermal
+throttling or a noisy neighbour hit every library alike. Inputs come from a
+shared arena (see arena.py), built before the runners start.
+
+The result is one file (bench.npz by default) in the format of results.py,
+which draw_figure.py reads like the per-suite files.
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+
+import op_eval
+import results
+from arena import Arena
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+commands = {
+    'numpy': [sys.executable, 'op_eval.py'],
+    'owl':   ['owl', 'op_eval.ml'],
+    'julia': ['julia', 'op_eval.jl'],
+}
+
+
+class RunnerError(Exception):
+    pass
+
+
+class Runner(object):
+    """One library's script, serving cells on its stdin and stdout."""
+
+    def __init__(self, library, cmd, env):
+        self.library = library
+        self.proc = subprocess.Popen(cmd, cwd=here, env=env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            universal_newlines=True, bufsize=1)
+        # anything a toplevel prints before the greeting is skipped
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                raise RunnerError("%s exited before serving" % library)
+            if line.startswith('ready'):
+                break
+
+    def run(self, suite, op, param, shape, warmup, samples, min_ms):
+        shape = 'x'.join(map(str, shape))
+        try:
+            self.proc.stdin.write('\t'.join(['cell', suite, op, param, shape,
+                str(warmup), str(samples), str(min_ms)]) + '\n')
+            self.proc.stdin.flush()
+        except (IOError, OSError):
+            raise RunnerError("%s exited" % self.library)
+        reply = self.proc.stdout.readline().rstrip('\n').split('\t')
+        if reply[0] != 'ok':
+            raise RunnerError(reply[-1] if len(reply) > 1 else 'no reply')
+        return int(reply[1]), [float(x) for x in reply[2:]]
+
+    def close(self):
+        try:
+            self.proc.stdin.write('quit\n')
+            self.proc.stdin.close()
+            self.proc.wait(10)
+        except (IOError, OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+
+
+def load_spec(fname):
+    with open(fname) as f:
+        return json.load(f)
+
+
+def cells_of(spec, suites=None, ops=None):
+    """(suite, op, param, shape) of every cell of the spec."""
+    cells = []
+    for s in spec['suites']:
+        if suites and s['suite'] not in suites:
+            continue
+        for o in s['ops']:
+            if ops and o['op'] not in ops:
+                continue
+            for param in o.get('params', ['']):
+                for shape in s['sizes']:
+                    cells.append((s['suite'], o['op'], param, tuple(shape)))
+    return cells
+
+
+def build_inputs(arena, cells):
+    for suite, _, _, shape in cells:
+        for seed in [0, 1]:
+            arena.get(shape, seed=seed)
+    arena.clear()
+
+
+def orchestrate(spec, runners, cells, seed=0):
+    """Samples and inner repeat count of every (library, cell) measured."""
+    policy = spec['policy']
+    rounds = policy.get('rounds', 1)
+    per_round = int(math.ceil(policy['samples'] / float(rounds)))
+    tasks = [(lib, c) for lib in runners for c in cells] * rounds
+    order = np.random.RandomState(seed).permutation(len(tasks))
+
+    samples, failed = {}, set()
+    for k, t in enumerate(order):
+        lib, c = tasks[t]
+        if (lib, c) in failed:
+            continue
+        try:
+            inner, ts = runners[lib].run(*(c + (policy['warmup'], per_round,
+                policy['min_sample_ms'])))
+        except RunnerError as e:
+            print("| %s %s %s: %s" % (lib, c[1], c[2], e))
+            failed.add((lib, c))
+            samples.pop((lib, c), None)
+            continue
+        prev = samples.get((lib, c), (inner, []))[1]
+        samples[(lib, c)] = (inner, prev + ts)
+        label = "%s(%s)" % (c[1], c[2]) if c[2] else c[1]
+        print("| %d/%d %s %s %s : median = %.5f" % (k + 1, len(order), lib,
+            label, 'x'.join(map(str, c[3])), np.median(ts)))
+    return samples
+
+
+def records(samples):
+    out = []
+    for (lib, (suite, op, param, shape)), (inner, ts) in sorted(
+            samples.items()):
+        times = op_eval.remove_outlier(ts)
+        t = op_eval.Timing(np.mean(times), np.std(times), np.array(ts), inner,
+            0, None, None)
+        out.append(results.record(suite, op, param, shape, 'float32', lib, t))
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run the op_eval scripts of every library together.')
+    parser.add_argument('spec', nargs='?', default=os.path.join(here,
+        'spec.json'), help='suites, ops, shapes and sample policy')
+    parser.add_argument('-l', '--library', action='append',
+        choices=sorted(commands),
+        help='libraries to run (repeatable; default those installed)')
+    parser.add_argument('--cmd', action='append', default=[],
+        metavar='LIB=COMMAND', help='command starting a library\'s runner, '
+        'e.g. "owl=owl op_eval.ml"')
+    parser.add_argument('-s', '--suite', action='append',
+        help='suites of the spec to run (repeatable)')
+    parser.add_argument('--op', action='append',
+        help='ops of the spec to run (repeatable)')
+    parser.add_argument('--rounds', type=int,
+        help='override the number of rounds of the spec')
+    parser.add_argument('--seed', type=int, default=0,
+        help='seed of the order of the cells')
+    parser.add_argument('--arena', default=os.environ.get('OP_EVAL_ARENA',
+        'arena'), help='directory of the shared inputs (default ./arena)')
+    parser.add_argument('-o', '--output', default='bench.npz')
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    if args.rounds:
+        spec['policy']['rounds'] = args.rounds
+    for c in args.cmd:
+        lib, _, cmd = c.partition('=')
+        commands[lib] = cmd.split()
+    libs = args.library or [lib for lib in sorted(commands)
+        if shutil.which(commands[lib][0])]
+
+    arena = os.path.abspath(args.arena)
+    cells = cells_of(spec, args.suite, args.op)
+    build_inputs(Arena(arena), cells)
+    env = dict(os.environ, OP_EVAL_SERVE='1', OP_EVAL_ARENA=arena,
+        OP_EVAL_CHECKPOINT='')
+
+    runners = {}
+    try:
+        for lib in libs:
+            try:
+                runners[lib] = Runner(lib, commands[lib], env)
+            except (RunnerError, OSError) as e:
+                print("| %s not available: %s" % (lib, e))
+        samples = orchestrate(spec, runners, cells, args.seed)
+    finally:
+        for r in runners.values():
+            r.close()
+
+    meta = results.host_meta()
+    meta['spec'] = spec
+    meta['seed'] = args.seed
+    results.save(args.output, records(samples), meta)
@@ -0,0 +1,202 @@
+#!/usr/bin/python
+
+"""
+Columnar result store for the op_eval scripts.
+
+A result file (.npz) holds one row per measured cell, with the columns
+below, every raw sample of every cell (flattened into `samples`, row i
+owning samples[offsets[i]:offsets[i+1]]), and the host metadata of the run
+as JSON. `load` reads any number of result files, plus the csv files still
+written by op_eval.ml and op_eval.jl, into one dict of NumPy arrays, so any
+statistic can be recomputed from the samples without rerunning anything.
+"""
+
+import csv
+import datetime
+import json
+import os
+import platform
+import socket
+
+import numpy as np
+
+import counters
+
+str_columns = ['suite', 'op', 'param', 'variant', 'shape', 'dtype', 'layout',
+    'cache', 'library', 'host', 'noise']
+# value of a column for rows that do not set it, '' if not listed
+str_defaults = {'layout': 'C', 'cache': 'warm'}
+int_columns = ['ndim', 'size', 'threads', 'inner']
+flt_columns = ['mean', 'std', 'mem_peak', 'mem_retained', 'mem_fresh',
+    'mem_peak_rss', 'mem_temps', 'hw_cycles', 'hw_instructions',
+    'hw_llc_misses', 'hw_branch_misses', 'hw_dtlb_misses', 'hw_ipc',
+    'hw_llc_misses_per_elem', 'hw_branch_misses_per_elem',
+    'hw_dtlb_misses_per_elem']
+columns = str_columns + int_columns + flt_columns
+
+
+def cpu_model():
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except (IOError, OSError):
+        pass
+    return platform.processor()
+
+
+def blas_info():
+    try:
+        cfg = np.show_config(mode='dicts')
+        deps = cfg['Build Dependencies']
+        return ', '.join('%s %s' % (d.get('name', k), d.get('version', ''))
+            for k, d in deps.items() if k in ('blas', 'lapack'))
+    except Exception:
+        return ''
+
+
+def host_meta():
+    return {
+        'host': socket.gethostname(),
+        'cpu': cpu_model(),
+        'machine': platform.machine(),
+        'cores': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'blas': blas_info(),
+        'time': datetime.datetime.now().isoformat(),
+    }
+
+
+def record(suite, op, param, shape, dtype, library, t, variant='',
+        layout='C', cache='warm'):
+    """One result row; `t` is an op_eval.Timing."""
+    shape = tuple(np.atleast_1d(shape).tolist())
+    r = {
+        'suite': suite, 'op': op, 'param': param, 'variant': variant,
+        'shape': 'x'.join(map(str, shape)), 'ndim': len(shape),
+        'size': int(np.prod(shape)), 'dtype': str(dtype), 'layout': layout,
+        'cache': cache, 'library': library, 'threads': t.threads,
+        'inner': t.inner, 'mean': t.mean, 'std': t.std, 'samples': t.samples,
+        'noise': '; '.join(t.noise or []),
+    }
+    r.update(t.memory or {})
+    if t.counters:
+        r.update(t.counters)
+        r.update(counters.derive(t.counters, r['size']))
+    return r
+
+
+def table(records, host=''):
+    res = {}
+    for c in str_columns:
+        default = host if c == 'host' else str_defaults.get(c, '')
+        res[c] = np.array([r.get(c, default) for r in records], dtype=str)
+    for c in int_columns:
+        res[c] = np.array([r.get(c, 0) for r in records], dtype=np.int64)
+    for c in flt_columns:
+        res[c] = np.array([r.get(c, np.nan) for r in records],
+            dtype=np.float64)
+    lengths = [len(r.get('samples', ())) for r in records]
+    res['offsets'] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    res['samples'] = np.concatenate([np.asarray(r.get('samples', ()),
+        dtype=np.float64) for r in records] or [np.zeros(0)])
+    return res
+
+
+def save(fname, records, meta=None):
+    meta = meta or host_meta()
+    res = table(records, meta['host'])
+    np.savez(fname, meta=np.array(json.dumps(meta)), **res)
+
+
+def concat(tables):
+    res = {}
+    for c in columns:
+        res[c] = np.concatenate([t[c] for t in tables])
+    res['samples'] = np.concatenate([t['samples'] for t in tables])
+    shift = np.cumsum([0] + [len(t['samples']) for t in tables[:-1]])
+    res['offsets'] = np.concatenate([[0]] +
+        [t['offsets'][1:] + s for t, s in zip(tables, shift)])
+    return res
+
+
+"""
+Legacy csv, as written by op_eval.ml and op_eval.jl: a header of sizes and
+one row per op, label then (mean, std) pairs, e.g. "max(axis=0),1.2, 0.1,".
+"""
+
+def parse_header(suite, cell):
+    if suite == 'slice':
+        return tuple(int(x) for x in cell.split('*'))
+    n = int(float(cell))
+    return {'simple': (n,), 'linalg': (n, n)}.get(suite, (n,) * 4)
+
+
+def load_csv(fname, suite, library):
+    records = []
+    with open(fname, 'r') as f:
+        reader = csv.reader(f, delimiter=',')
+        header = next(reader)
+        shapes = [parse_header(suite, x) for x in header[1::2]]
+        for val in reader:
+            if not val:
+                continue
+            op, _, param = val[0].partition('(')
+            vals = [float(x) for x in val[1:] if x.strip()]
+            for k, shape in enumerate(shapes):
+                records.append({'suite': suite, 'op': op,
+                    'param': param[:-1], 'shape': 'x'.join(map(str, shape)),
+                    'ndim': len(shape), 'size': int(np.prod(shape)),
+                    'dtype': 'float32', 'library': library,
+                    'mean': vals[2 * k], 'std': vals[2 * k + 1]})
+    return table(records)
+
+
+def load(fnames, suite=None, library=None):
+    """Load result files; csv files need the suite and library they hold,
+    which default to what their name says, e.g. axis_owl.csv."""
+    tables = []
+    for f in fnames:
+        if f.endswith('.csv'):
+            stem = os.path.splitext(os.path.basename(f))[0]
+            s, _, lib = stem.rpartition('_')
+            tables.append(load_csv(f, suite or s, library or lib))
+        else:
+            with np.load(f) as z:
+                t = dict((k, z[k]) for k in z.files if k != 'meta')
+            # files written before a column existed
+            for c in str_columns:
+                t.setdefault(c, np.full(len(t['op']),
+                    str_defaults.get(c, '')))
+            for c in flt_columns:
+                t.setdefault(c, np.full(len(t['op']), np.nan))
+            tables.append(t)
+    return concat(tables)
+
+
+def meta(fname):
+    with np.load(fname) as z:
+        return json.loads(str(z['meta']))
+
+
+# Selecting rows and recomputing statistics from the samples
+
+def select(res, mask=None, **kw):
+    mask = np.ones(len(res['op']), bool) if mask is None else mask
+    for k, v in kw.items():
+        mask = mask & (res[k] == v)
+    out = dict((c, res[c][mask]) for c in columns)
+    lengths = np.diff(res['offsets'])
+    out['samples'] = res['samples'][np.repeat(mask, lengths)]
+    out['offsets'] = np.concatenate([[0], np.cumsum(lengths[mask])])
+    return out
+
+
+def samples(res, i):
+    return res['samples'][res['offsets'][i]:res['offsets'][i + 1]]
+
+
+def restat(res, fn):
+    return np.array([fn(samples(res, i)) for i in range(len(res['op']))])
@@ -0,0 +1,191 @@
+#!/usr/bin/python
+
+"""
+Throughput and roofline metrics.
+
+Every op of op_eval (by name, shared with the OCaml and Julia scripts)
+carries a cost model giving the bytes it moves and the flops it performs
+for a given input, so measured times turn into effective bandwidth (GB/s)
+and compute rate (GFLOP/s). Conventions: bytes count each input read and
+each output written once (caches ignored); an elementwise function counts
+as one flop per element, whatever its implementation costs, except where
+the op is itself a composition (sigmoid) or a known algorithm (sort, linalg,
+whose counts are the usual leading terms).
+
+`probe` measures the ceilings of the host: a STREAM-like triad for memory
+bandwidth and a large dense GEMM for peak compute; `python roofline.py
+--probe` stores them in peak.json, which draw_figure.py uses for its
+roofline chart.
+"""
+
+import argparse
+import json
+import math
+
+import numpy as np
+
+import clock
+import results
+
+# elementwise: per element, (flops, arrays read + written)
+elementwise = {
+    'copy': (0, 2), 'abs': (1, 2), 'exp': (1, 2), 'log': (1, 2),
+    'sqrt': (1, 2), 'cbrt': (1, 2), 'sin': (1, 2), 'tan': (1, 2),
+    'asin': (1, 2), 'sinh': (1, 2), 'asinh': (1, 2), 'round': (1, 2),
+    'sigmoid': (4, 2),
+    'add': (1, 3), 'mul': (1, 3), 'div': (1, 3), 'pow': (1, 3),
+    'hypot': (1, 3), 'min2': (1, 3), 'fmod': (1, 3),
+}
+
+# reductions write n / (reduced extent) elements, scans write n
+reduction = ['max', 'sum', 'prod', 'sum_reduce']
+scan = ['cumprod', 'cummax']
+
+# linalg on n*n: (flops / n^3, n*n arrays read + written)
+linalg = {
+    'matmul': (2., 3), 'inv': (2., 2), 'eigvals': (10., 1),
+    'svd': (21., 3), 'lu': (2. / 3, 4), 'qr': (8. / 3, 3),
+}
+
+# stacks of B matrices m*n (batched, tall): flops per matrix; bytes count the
+# stack read and written once
+stacked = {
+    'matmul':   lambda m, n: 2. * m * n * n,
+    'solve':    lambda m, n: 2. / 3 * n ** 3 + 2. * n * n,
+    'cholesky': lambda m, n: 1. / 3 * n ** 3,
+    'eigh':     lambda m, n: 9. * n ** 3,
+    'inv':      lambda m, n: 2. * n ** 3,
+    'qr':       lambda m, n: 2. * m * n * n - 2. / 3 * n ** 3,
+    'svdvals':  lambda m, n: 4. * m * n * n - 4. / 3 * n ** 3,
+}
+
+peak_file = 'peak.json'
+
+
+def reduced(param, shape):
+    """Product of the extents reduced over, from "axis=0" or "axes=0*3";
+    other keys, e.g. the chunk size of out-of-core runs, are ignored."""
+    p = dict(kv.split('=', 1) for kv in param.split(',') if '=' in kv)
+    a = p.get('axis', p.get('axes'))
+    axes = a.split('*') if a else []
+    return int(np.prod([shape[int(a)] for a in axes])) if axes else 1
+
+
+def conv_cost(op, param, shape, s):
+    """conv2d ("same", as many output channels as input ones) and pooling
+    ("valid") of an NHWC input, see suite_conv in op_eval.py."""
+    p = dict(kv.split('=') for kv in param.split(','))
+    k, stride = int(p['kernel']), int(p['stride'])
+    b, h, w, c = shape
+    if op == 'conv2d':
+        ho, wo = -(-h // stride), -(-w // stride)
+        out = b * ho * wo * c
+        return 2. * out * k * k * c, float((b * h * w * c + out + k * k * c *
+            c) * s)
+    ho, wo = (h - k) // stride + 1, (w - k) // stride + 1
+    out = b * ho * wo * c
+    return float(out * k * k), float((b * h * w * c + out) * s)
+
+
+def cost(op, param, shape, dtype):
+    """(flops, bytes) of one call, NaN when the op has no model."""
+    shape = [int(x) for x in shape.split('x')]
+    n = int(np.prod(shape))
+    s = np.dtype(dtype).itemsize
+    if op == 'sort':
+        return n * math.log2(max(n, 2)), 2. * n * s
+    if op in elementwise:
+        f, k = elementwise[op]
+        return float(f * n), float(k * n * s)
+    if op in reduction:
+        r = reduced(param, shape)
+        return float(n), float((n + n // r) * s)
+    if op in scan:
+        return float(n), 2. * n * s
+    if op in ['tile', 'repeat'] and '=' in param:
+        reps = [int(x) for x in param.split('=', 1)[1].split('*')]
+        return 0., float((n + n * int(np.prod(reps))) * s)
+    if op in ['conv2d', 'max_pool2d', 'avg_pool2d'] and '=' in param:
+        return conv_cost(op, param, shape, s)
+    if op in stacked and len(shape) == 3:
+        b, m, k = shape
+        return b * stacked[op](m, k), 2. * n * s
+    if op in linalg:
+        f, k = linalg[op]
+        return f * shape[0] ** 3, float(k * n * s)
+    return float('nan'), float('nan')
+
+
+def annotate(res):
+    """Add bytes, flops, gbps and gflops columns to a result table."""
+    memo = {}
+    fl, by = [], []
+    for i in range(len(res['op'])):
+        k = (res['op'][i], res['param'][i], res['shape'][i], res['dtype'][i])
+        if k not in memo:
+            memo[k] = cost(*k)
+        fl.append(memo[k][0])
+        by.append(memo[k][1])
+    res['flops'] = np.array(fl)
+    res['bytes'] = np.array(by)
+    sec = res['mean'] * 1e-3
+    with np.errstate(divide='ignore', invalid='ignore'):
+        res['gflops'] = res['flops'] / sec * 1e-9
+        res['gbps'] = res['bytes'] / sec * 1e-9
+    return res
+
+
+# Machine peaks
+
+def triad(n=1 << 24):
+    """STREAM-like triad a = b + s * c on float64 arrays, in GB/s."""
+    b = np.random.rand(n)
+    c = np.random.rand(n)
+    a = np.empty(n)
+    def g():
+        np.multiply(c, 3.0, out=a)
+        np.add(a, b, out=a)
+    t = np.median(clock.measure(g)[0]) * 1e-3
+    # numpy needs two passes: c read, a written, then a and b read, a written
+    return 5 * n * 8 / t * 1e-9
+
+
+def gemm(n=2048, dtype='float64'):
+    x = np.random.rand(n, n).astype(dtype)
+    y = np.random.rand(n, n).astype(dtype)
+    t = np.median(clock.measure(lambda: np.dot(x, y))[0]) * 1e-3
+    return 2. * n ** 3 / t * 1e-9
+
+
+def probe():
+    return {'gbps': triad(), 'gflops': gemm(),
+        'gflops_float32': gemm(dtype='float32'), 'host': results.host_meta()}
+
+
+def load_peak(fname=peak_file):
+    with open(fname) as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Throughput and peaks.')
+    parser.add_argument('files', nargs='*', help='result files to report on')
+    parser.add_argument('--probe', action='store_true',
+        help='measure the machine peaks and write them to ' + peak_file)
+    args = parser.parse_args()
+
+    if args.probe:
+        peak = probe()
+        print("triad %.2f GB/s, dgemm %.2f GFLOP/s, sgemm %.2f GFLOP/s" %
+            (peak['gbps'], peak['gflops'], peak['gflops_float32']))
+        with open(peak_file, 'w') as f:
+            json.dump(peak, f, indent=2)
+    if args.files:
+        res = annotate(results.load(args.files))
+        for i in range(len(res['op'])):
+            op = res['op'][i]
+            if res['param'][i]:
+                op = "%s(%s)" % (op, res['param'][i])
+            print("%-8s %-8s %-30s %-14s %10.5f ms %9.3f GB/s %9.3f GFLOP/s" %
+                (res['library'][i], res['suite'][i], op, res['shape'][i],
+                res['mean'][i], res['gbps'][i], res['gflops'][i]))
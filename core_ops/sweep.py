@@ -0,0 +1,133 @@
+#!/usr/bin/python
+
+"""
+Sweep runners for the op_eval suites.
+
+A runner is called as runner(fn, cells, threaded) and returns a dict from
+each cell to fn(cell). `serial` runs every cell in the calling process.
+`Runner` farms cells out to a pool of worker processes, each pinned to its
+own core (the kernel's isolated cores when there are any) with BLAS/OpenMP
+limited to one thread, so that single-threaded cells can run side by side
+without disturbing each other; with `threads` > 1 each worker gets a group
+of that many cores and as many BLAS/OpenMP threads instead. Suites flagged
+`threaded` (matmul, svd, ...) are either run the same way, or, in exclusive
+mode, one cell at a time in the calling process on the whole machine.
+"""
+
+import contextlib
+import multiprocessing
+import os
+
+thread_vars = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS']
+
+
+def parse_cpulist(s):
+    cores = []
+    for part in s.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-')
+            cores.extend(range(int(lo), int(hi) + 1))
+        else:
+            cores.append(int(part))
+    return cores
+
+
+def available_cores():
+    cores = sorted(os.sched_getaffinity(0))
+    try:
+        with open('/sys/devices/system/cpu/isolated') as f:
+            isolated = parse_cpulist(f.read())
+    except (IOError, OSError):
+        isolated = []
+    isolated = [c for c in isolated if c in cores]
+    return isolated or cores
+
+
+@contextlib.contextmanager
+def blas_threads(n):
+    """Set the thread-count variables seen by processes started inside."""
+    saved = dict((v, os.environ.get(v)) for v in thread_vars)
+    for v in thread_vars:
+        os.environ[v] = str(n)
+    try:
+        yield
+    finally:
+        for v, val in saved.items():
+            if val is None:
+                os.environ.pop(v, None)
+            else:
+                os.environ[v] = val
+
+
+def limit_threads(n):
+    """Limit the BLAS/OpenMP pools already loaded in this process, if
+    threadpoolctl is installed; the returned limiter must be kept alive."""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return None
+    return threadpool_limits(limits=n)
+
+
+def current_threads():
+    """BLAS/OpenMP threads available to this process."""
+    try:
+        from threadpoolctl import threadpool_info
+        n = [p['num_threads'] for p in threadpool_info()]
+        if n:
+            return max(n)
+    except ImportError:
+        pass
+    for v in thread_vars:
+        if os.environ.get(v, '').isdigit():
+            return int(os.environ[v])
+    return os.cpu_count()
+
+
+_limiter = None
+
+def init_worker(queue, threads):
+    global _limiter
+    group = queue.get()
+    os.sched_setaffinity(0, group)
+    _limiter = limit_threads(threads)
+
+
+def serial(fn, cells, threaded=False):
+    return dict((c, fn(c)) for c in cells)
+
+
+class Runner(object):
+
+    def __init__(self, jobs=None, exclusive=True, threads=1, cores=None):
+        cores = cores or available_cores()
+        self.groups = [cores[i:i + threads]
+            for i in range(0, len(cores) - threads + 1, threads)]
+        # not enough cores for one full group: oversubscribe all of them
+        self.groups = self.groups or [cores]
+        self.jobs = min(jobs or len(self.groups), len(self.groups))
+        self.exclusive = exclusive
+        self.threads = threads
+
+    def pool(self):
+        # spawn, so that workers load BLAS after the thread limits are set
+        ctx = multiprocessing.get_context('spawn')
+        queue = ctx.Queue()
+        for g in self.groups[:self.jobs]:
+            queue.put(g)
+        with blas_threads(self.threads):
+            return ctx.Pool(self.jobs, init_worker, (queue, self.threads))
+
+    def __call__(self, fn, cells, threaded=False):
+        if threaded and self.exclusive:
+            return serial(fn, cells)
+        pool = self.pool()
+        try:
+            results = pool.map(fn, cells, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        return dict(zip(cells, results))
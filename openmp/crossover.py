@@ -0,0 +1,159 @@
+#!/usr/bin/python
+
+"""
+Find the input size at which one execution configuration starts to beat
+another, e.g. where 4 threads become faster than 1 for `add`.
+
+The search brackets the crossover on a coarse log grid, then bisects the
+bracket (geometrically) until it is narrower than `--rtol`. At every size,
+both configurations are timed in their own pinned worker (see
+core_ops/sweep.py) and compared with a Mann-Whitney U test; if the
+difference is not significant, more samples are taken, and if it is still
+not significant the two are tied. A tie means b does not beat a yet: at the
+smallest sizes both take microseconds and ties are noise, and ufuncs that
+are not threaded tie everywhere, so ties count on the a side of the bracket
+and the search goes on; only a tie at every size of the grid is reported.
+The result is the geometric middle of the final bracket, with the bracket
+as error bar.
+
+Sizes are the number of elements for the `simple` suite, and the edge
+length of the square/4d input for `linalg` and `axis`/`axes`/`repeat`.
+"""
+
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+import scipy.stats
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'core_ops'))
+import op_eval
+import sweep
+
+shape_of = {
+    'simple': lambda n: n,
+    'linalg': lambda n: [n, n],
+    'axis':   lambda n: [n] * 4,
+    'axes':   lambda n: [n] * 4,
+    'repeat': lambda n: [n] * 4,
+}
+
+
+class Compare(object):
+    """Times one op under two configurations, each in its own worker."""
+
+    def __init__(self, suite, op, threads_a, threads_b, alpha, retries):
+        self.suite, self.op = suite, op
+        self.alpha, self.retries = alpha, retries
+        self.pools = [sweep.Runner(1, False, threads=t).pool()
+            for t in (threads_a, threads_b)]
+
+    def close(self):
+        for p in self.pools:
+            p.close()
+            p.join()
+
+    def samples(self, k, n):
+        args = (self.suite, self.op, shape_of[self.suite](n))
+        return self.pools[k].apply(op_eval.run_at, args).samples
+
+    def __call__(self, n):
+        """Return -1 if a is faster at size n, 1 if b is, 0 if tied."""
+        a, b = np.array([]), np.array([])
+        for _ in range(self.retries + 1):
+            a = np.append(a, self.samples(0, n))
+            b = np.append(b, self.samples(1, n))
+            p = scipy.stats.mannwhitneyu(a, b, alternative='two-sided')[1]
+            if p < self.alpha:
+                return -1 if np.median(a) < np.median(b) else 1
+        return 0
+
+
+def bracket(cmp, grid):
+    """Return (lo, hi, tied) with b not beating a up to lo and winning at
+    hi, None for either end if the crossover lies outside the grid, and
+    whether every size below hi was a tie."""
+    lo, tied = None, True
+    for n in grid:
+        d = cmp(n)
+        if d > 0:
+            return lo, n, False
+        lo, tied = n, tied and d == 0
+    return lo, None, tied
+
+
+def search(cmp, lo, hi, rtol):
+    while hi > lo * (1 + rtol) and hi - lo > 1:
+        mid = int(round(math.sqrt(lo * hi)))
+        mid = min(max(mid, lo + 1), hi - 1)
+        if cmp(mid) > 0:
+            hi = mid
+        else:
+            lo = mid
+    return int(round(math.sqrt(lo * hi))), lo, hi
+
+
+def crossover(cmp, grid, rtol):
+    """(threshold, lo, hi); the threshold is None if there is none in the
+    grid, with lo = hi = None if every size of it was a tie."""
+    lo, hi, tied = bracket(cmp, grid)
+    if hi is None and tied:
+        return None, None, None
+    if lo is None or hi is None:
+        return None, lo, hi
+    return search(cmp, lo, hi, rtol)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Crossover size between two thread configurations.')
+    parser.add_argument('op', help='row label of the op, e.g. add or matmul')
+    parser.add_argument('-s', '--suite', default='simple',
+        choices=sorted(shape_of))
+    parser.add_argument('-a', type=int, default=1,
+        help='threads of the first (serial) configuration, default 1')
+    parser.add_argument('-b', type=int, default=os.cpu_count(),
+        help='threads of the second configuration, default all cores')
+    parser.add_argument('--min', type=int, default=10)
+    parser.add_argument('--max', type=int, default=10000000)
+    parser.add_argument('--points', type=int, default=7,
+        help='points of the coarse log grid')
+    parser.add_argument('--rtol', type=float, default=0.1,
+        help='stop once the bracket is narrower than this, relatively')
+    parser.add_argument('--alpha', type=float, default=0.01)
+    parser.add_argument('--retries', type=int, default=2,
+        help='extra rounds of samples before declaring a tie')
+    parser.add_argument('-o', '--output',
+        help='append op,suite,a,b,threshold,lo,hi to this csv')
+    args = parser.parse_args()
+
+    grid = np.unique(np.geomspace(args.min, args.max, args.points).astype(int))
+    cmp = Compare(args.suite, args.op, args.a, args.b, args.alpha,
+        args.retries)
+    try:
+        n, lo, hi = crossover(cmp, grid, args.rtol)
+    finally:
+        cmp.close()
+
+    if n is None and lo is None and hi is None:
+        print("%s: %d and %d threads are tied from %d to %d" %
+            (args.op, args.a, args.b, args.min, args.max))
+    elif n is None and hi is None:
+        print("%s: %d threads never beat %d up to %d" %
+            (args.op, args.b, args.a, args.max))
+    elif n is None:
+        print("%s: %d threads already beat %d at %d" %
+            (args.op, args.b, args.a, args.min))
+    else:
+        print("%s: %d threads beat %d from size %d (between %d and %d)" %
+            (args.op, args.b, args.a, n, lo, hi))
+    if args.output:
+        fresh = not os.path.exists(args.output)
+        with open(args.output, 'a') as f:
+            if fresh:
+                f.write("op,suite,a,b,threshold,lo,hi\n")
+            f.write("%s,%s,%d,%d,%s,%s,%s\n" % (args.op, args.suite,
+                args.a, args.b, n, lo, hi))
@@ -13,8 +13,20 @@ let dummy_conv2d out inp kern stride =
 let funarr1 = [|N.abs_; N.sin_; N.erf_;|]
 let funarr2 = [|N.add_; N.pow_; copy_mutable|]
 let funarr3 = [|dummy_conv2d|]
-
-let test_len = [|10; 100; 1000; 10000; 100000; 200000; 400000; 600000; 800000; 1000000; 2000000|]
+let funarr1_name = [|"abs"; "sin"; "erf"|]
+let funarr2_name = [|"add"; "pow"; "copy"|]
+let funarr3_name = [|"conv2d"|]
+
+(* OpenMP thread count of this run, recorded in the output table *)
+let threads = try int_of_string (Sys.getenv "OMP_NUM_THREADS") with _ -> 1
+let output = "openmp_cross.csv"
+
+(* CROSSPOINT_SIZES overrides the sizes, e.g. with the cache-aware grid of
+   `python ../core_ops/cachegrid.py --arity 2` *)
+let test_len =
+  try Sys.getenv "CROSSPOINT_SIZES" |> String.split_on_char ','
+    |> List.map (fun s -> int_of_string (String.trim s)) |> Array.of_list
+  with Not_found -> [|10; 100; 1000; 10000; 100000; 200000; 400000; 600000; 800000; 1000000; 2000000|]
 let n = Array.length test_len 
 let test_len_f = Array.map float_of_int test_len 
 let test_len_sqrt = N.(of_array test_len_f [|n|] |> sqrt |> to_array |> Array.map int_of_float)
@@ -83,7 +95,8 @@ let main () =
 		for j = 0 to Array.length test_len - 1 do
 			let sz = test_len.(j) in 
 			let mu, std = f_timing_wrapper1 fn sz in
-			result_str := !result_str ^ (Printf.sprintf "%d, %.4f, %.4f\n" sz mu std)
+			result_str := !result_str ^ (Printf.sprintf "%s, %d, %d, %.4f, %.4f\n"
+				funarr1_name.(i) sz threads mu std)
 		done
 	done;
 
@@ -92,7 +105,8 @@ let main () =
 		for j = 0 to Array.length test_len - 1 do
 			let sz = test_len.(j) in 
 			let mu, std = f_timing_wrapper2 fn sz in
-			result_str := !result_str ^ (Printf.sprintf "%d, %.4f, %.4f\n" sz mu std)
+			result_str := !result_str ^ (Printf.sprintf "%s, %d, %d, %.4f, %.4f\n"
+				funarr2_name.(i) sz threads mu std)
 		done
 	done;
   
@@ -101,12 +115,17 @@ let main () =
 		for j = 0 to Array.length test_len_sqrt - 1 do
 			let sz = test_len_sqrt.(j) in 
 			let mu, std = f_timing_wrapper3 fn sz in
-			result_str := !result_str ^ (Printf.sprintf "%d, %.4f, %.4f\n" (test_len.(j)) mu std)
+			result_str := !result_str ^ (Printf.sprintf "%s, %d, %d, %.4f, %.4f\n"
+				funarr3_name.(i) (test_len.(j)) threads mu std)
 		done
 	done;
 
-	Owl_io.write_file "eval_omp_cross.csv" !result_str;
-	()
+	(* append, so that runs at several thread counts end up in one table *)
+	let fresh = not (Sys.file_exists output) in
+	let oc = open_out_gen [Open_append; Open_creat] 0o644 output in
+	if fresh then output_string oc "op, size, threads, mean, std\n";
+	output_string oc !result_str;
+	close_out oc
 
 let _ = main ()
 
@@ -1,10 +1,12 @@
 #!/usr/bin/python
 
-import csv 
-import numpy as np
+import collections
+import csv
+import math
+import os
+import sys
 import matplotlib
 import matplotlib.pyplot as plt
-import matplotlib.pylab as pylab
 
 font=13 #'x-large'
 params = {'legend.fontsize': font,
@@ -15,65 +17,98 @@ params = {'legend.fontsize': font,
          'ytick.labelsize':font}
 matplotlib.rcParams.update(params)
 
-N = 7 # number of function
-nt = 11 # number of test cases for each fucntion
-n = 3 # number of test cases: no-omp, omp-thrd=2, ...
-label = ['no-omp', 'omp-thrd-2', 'omp-thrd-4']
-ops = ['abs', 'sin', 'erf', 'add', 'pow', 'copy', 'conv2d']
-mus = [[], [], []]; stds = [[], [], []]; sizes = []
-with open("openmp_cross.csv", 'rb') as csvf:
-    reader = csv.reader(csvf, delimiter=',')
-    for val in reader:
-        sizes.append(float(val[0]))
-        mus[0].append(float(val[1]))
-        mus[1].append(float(val[3]))
-        mus[2].append(float(val[5]))
-        stds[0].append(float(val[2]))
-        stds[1].append(float(val[4]))
-        stds[2].append(float(val[6]))
-
-figs = []; ax = []
-
-fig, ax = plt.subplots(2,2)
-for i in range(4):
-	rects = []
-	axes = ax[i / 2][i % 2]
-
-	for j in range(n):
-	    rects.append(axes.errorbar(sizes[i * nt : (i+1) * nt - 1], mus[j][i * nt : (i+1) * nt - 1],
-	        yerr=stds[j][i * nt : (i + 1) * nt - 1], label=label[j]))
-	axes.set_ylabel('Time(ms)')
-	axes.set_xlabel('Input array size for op ' + ops[i])
-	axes.set_xscale('log', nonposx='clip')
-	axes.set_yscale('log')
-	axes.legend()
-	axes.grid(True)
-
-
-fig, ax = plt.subplots(1,2)
-for i in range(4,6):
-	axes = ax[i - 5]
-	for j in range(n):
-	    rects.append(axes.errorbar(sizes[i * nt : (i+1) * nt - 1], mus[j][i * nt : (i+1) * nt - 1],
-	        yerr=stds[j][i * nt : (i + 1) * nt - 1], label=label[j]))
-	axes.set_ylabel('Time(ms)')
-	axes.set_xlabel('Input array size for op ' + ops[i])
-	axes.set_xscale('log', nonposx='clip')
-	axes.set_yscale('log')
-	axes.legend()
-	axes.grid(True)
-
-
-fig, axes = plt.subplots(1,1)
-i = 6
-for j in range(n):
-    rects.append(axes.errorbar(sizes[i * nt : (i+1) * nt - 1], mus[j][i * nt : (i+1) * nt - 1],
-        yerr=stds[j][i * nt : (i + 1) * nt - 1], label=label[j]))
-axes.set_ylabel('Time(ms)')
-axes.set_xlabel('Input array size for op ' + ops[i])
-axes.set_xscale('log', nonposx='clip')
-axes.set_yscale('log')
-axes.legend()
-axes.grid(True)
+per_fig = 4 # ops per figure, on a 2x2 grid
 
+"""
+Read tidy tables (op, size, threads, mean, std), as written by
+thread_sweep.py and crosspoint.ml. Each (file, thread count) is one series.
+"""
+
+def load(fnames):
+    data = collections.OrderedDict()
+    for f in fnames:
+        tag = os.path.splitext(os.path.basename(f))[0]
+        with open(f, 'r') as csvf:
+            for row in csv.DictReader(csvf, skipinitialspace=True):
+                series = (tag, int(row['threads']))
+                s = data.setdefault(row['op'], collections.OrderedDict())
+                s = s.setdefault(series, ([], [], []))
+                s[0].append(float(row['size']))
+                s[1].append(float(row['mean']))
+                s[2].append(float(row['std']))
+    return data
+
+
+"""
+Tables of throughput.py (op, size, workers, ops_per_s, ..., efficiency) are
+drawn instead as calls per second and scaling efficiency against workers,
+one line per (op, size).
+"""
+
+def is_throughput(fname):
+    with open(fname, 'r') as csvf:
+        return 'workers' in next(csv.reader(csvf, skipinitialspace=True))
+
+
+def load_throughput(fnames):
+    data = collections.OrderedDict()
+    for f in fnames:
+        with open(f, 'r') as csvf:
+            for row in csv.DictReader(csvf, skipinitialspace=True):
+                s = data.setdefault((row['op'], int(row['size'])),
+                    ([], [], []))
+                s[0].append(int(row['workers']))
+                s[1].append(float(row['ops_per_s']))
+                s[2].append(float(row['efficiency']))
+    return data
+
+
+def draw_throughput(data):
+    fig, ax = plt.subplots(1, 2)
+    for (op, size), (ks, ops, eff) in data.items():
+        label = '%s (%d)' % (op, size)
+        ax[0].plot(ks, ops, marker='o', label=label)
+        ax[1].plot(ks, eff, marker='o', label=label)
+    ax[0].set_ylabel('Calls per second')
+    ax[0].set_yscale('log')
+    ax[1].set_ylabel('Scaling efficiency')
+    ax[1].set_ylim(0, 1.1)
+    for axes in ax:
+        axes.set_xlabel('Concurrent workers')
+        axes.set_xscale('log', base=2)
+        axes.grid(True)
+    ax[0].legend()
+
+
+def draw(data, many_files):
+    ops = list(data.keys())
+    for k in range(0, len(ops), per_fig):
+        group = ops[k : k + per_fig]
+        rows = int(math.ceil(len(group) / 2.))
+        cols = 1 if len(group) == 1 else 2
+        fig, ax = plt.subplots(rows, cols, squeeze=False)
+        for i, op in enumerate(group):
+            axes = ax[i // 2][i % 2]
+            for (tag, t), (sizes, mus, stds) in data[op].items():
+                label = 'threads=%d' % t
+                if many_files:
+                    label = tag + ', ' + label
+                axes.errorbar(sizes, mus, yerr=stds, label=label)
+            axes.set_ylabel('Time(ms)')
+            axes.set_xlabel('Input array size for op ' + op)
+            axes.set_xscale('log')
+            axes.set_yscale('log')
+            axes.legend()
+            axes.grid(True)
+        for i in range(len(group), rows * cols):
+            ax[i // 2][i % 2].set_visible(False)
+
+
+fnames = sys.argv[1:] or ['openmp_threads.csv']
+tput = [f for f in fnames if is_throughput(f)]
+rest = [f for f in fnames if f not in tput]
+if tput:
+    draw_throughput(load_throughput(tput))
+if rest:
+    draw(load(rest), len(rest) > 1)
 plt.show()
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+
+"""
+Thread-scaling sweep for NumPy/BLAS.
+
+Reruns op_eval suites once per thread count, each cell in a worker process
+pinned to that many cores with OpenBLAS/MKL/OpenMP limited to as many
+threads (see core_ops/sweep.py), and writes one tidy table
+
+    op, size, threads, mean, std
+
+where size is the number of elements of the input. draw_fig.py reads it.
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'core_ops'))
+import op_eval
+import sweep
+
+header = ['op', 'size', 'threads', 'mean', 'std']
+
+
+def cells_of(suite, ops):
+    s = op_eval.suites[suite]()
+    return [(suite, i, j)
+        for i, row in enumerate(s.rows) if not ops or row.label in ops
+        for j in range(len(s.sizes))]
+
+
+def thread_sweep(suites, ops, threads, jobs):
+    table = []
+    for t in threads:
+        runner = sweep.Runner(jobs, exclusive=False, threads=t)
+        for suite in suites:
+            s = op_eval.suites[suite]()
+            cells = cells_of(suite, ops)
+            results = runner(op_eval.run_cell, cells)
+            for c in cells:
+                # unsupported cells are left out, as in op_eval.evaluate
+                if results.get(c) is None:
+                    continue
+                mu, std = results[c][:2]
+                size = int(np.prod(s.sizes[c[2]]))
+                table.append((s.rows[c[1]].label, size, t, mu, std))
+    return table
+
+
+def write_table(fname, table):
+    with open(fname, 'w') as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        for op, size, t, mu, std in table:
+            w.writerow([op, size, t, '%.5f' % mu, '%.5f' % std])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='NumPy/BLAS thread scaling.')
+    parser.add_argument('-t', '--threads', default='1,2,4',
+        help='comma-separated thread counts (default: 1,2,4)')
+    parser.add_argument('-s', '--suite', action='append',
+        choices=list(op_eval.suites),
+        help='suite to run, may be repeated (default: simple and linalg)')
+    parser.add_argument('--op', action='append',
+        help='only run rows with this label, may be repeated')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='cells run concurrently, each on its own group of cores')
+    parser.add_argument('-o', '--output', default='openmp_threads.csv')
+    args = parser.parse_args()
+
+    threads = [int(t) for t in args.threads.split(',')]
+    table = thread_sweep(args.suite or ['simple', 'linalg'], args.op,
+        threads, args.jobs)
+    write_table(args.output, table)
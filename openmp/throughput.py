@@ -0,0 +1,145 @@
+#!/usr/bin/python
+
+"""
+Throughput of an op under concurrent load.
+
+Every cell of op_eval.py is timed alone on an idle machine. Here K worker
+processes, each pinned to its own core with one BLAS/OpenMP thread (see
+core_ops/sweep.py), run the same (op, size) cell at once for `--duration`
+seconds, starting together at a barrier, with K swept from 1 to the number
+of cores. Calls are timed in batches of at least 0.1 ms, so the latency of
+a call shorter than that is the mean of its batch. For every K the table
+gets the aggregate calls per second of all workers, the p50 and p99 latency
+of a call in ms, and the scaling efficiency, the throughput over K times
+that of one worker: memory-bound ops fall off as soon as the workers share
+up DRAM bandwidth, well before every core is busy.
+
+The result is one tidy table
+
+    suite, op, size, workers, ops_per_s, p50, p99, efficiency
+
+which draw_fig.py draws as throughput and efficiency against workers.
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'core_ops'))
+import clock
+import op_eval
+import sweep
+
+header = ['suite', 'op', 'size', 'workers', 'ops_per_s', 'p50', 'p99',
+    'efficiency']
+
+batch_ns = 100 * 1000
+
+
+def worker(cell, core, duration, barrier, queue):
+    os.sched_setaffinity(0, [core])
+    limiter = sweep.limit_threads(1)     # kept alive while the worker runs
+    g = op_eval.cell_fn(cell)
+    inner = clock.calibrate(g, batch_ns)
+    for _ in range(clock.warmup):
+        clock.run(g, inner)
+    barrier.wait()
+    lat, calls = [], 0
+    start = t = time.perf_counter_ns()
+    end = start + duration * 1e9
+    while t < end:
+        clock.run(g, inner)
+        now = time.perf_counter_ns()
+        lat.append((now - t) / inner / 1e6)
+        calls += inner
+        t = now
+    queue.put((calls / ((t - start) / 1e9), lat))
+
+
+def load(cell, k, cores, duration):
+    """(calls per second of all workers, latencies in ms) of k workers."""
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(k)
+    queue = ctx.Queue()
+    with sweep.blas_threads(1):
+        procs = [ctx.Process(target=worker, args=(cell, cores[i % len(cores)],
+            duration, barrier, queue)) for i in range(k)]
+        for p in procs:
+            p.start()
+    # read before joining, as a worker exits only once its result is sent
+    out = [queue.get(timeout=duration + 600) for _ in procs]
+    for p in procs:
+        p.join()
+    return sum(r for r, _ in out), np.concatenate([l for _, l in out])
+
+
+def counts(n):
+    """1, 2, 4, ... up to n, and n."""
+    k = [1 << i for i in range(n.bit_length()) if 1 << i <= n]
+    return k + [n] if k[-1] != n else k
+
+
+def throughput(cells, ks, duration):
+    cores = sweep.available_cores()
+    table = []
+    for cell in cells:
+        s = op_eval.suites[cell[0]]()
+        label = s.rows[cell[1]].label
+        size = int(np.prod(s.sizes[cell[2]]))
+        base = None
+        for k in ks:
+            ops, lat = load(cell, k, cores, duration)
+            if k == 1:
+                base = ops
+            p50, p99 = np.percentile(lat, [50, 99])
+            table.append((cell[0], label, size, k, ops, p50, p99,
+                ops / (k * base)))
+            print("| %s (%d) x%d : %.0f ops/s, p50 %.5f, p99 %.5f ms, "
+                "efficiency %.2f" % table[-1][1:])
+    return table
+
+
+def write_table(fname, table):
+    with open(fname, 'w') as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        for suite, op, size, k, ops, p50, p99, eff in table:
+            w.writerow([suite, op, size, k, '%.1f' % ops, '%.5f' % p50,
+                '%.5f' % p99, '%.3f' % eff])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Throughput of op_eval cells under concurrent load.')
+    parser.add_argument('-s', '--suite', action='append',
+        choices=list(op_eval.suites),
+        help='suite to run, may be repeated (default: simple)')
+    parser.add_argument('--op', action='append',
+        help='only run rows with this op name, label or tag, may be repeated')
+    parser.add_argument('--size', action='append', type=int,
+        help='only run inputs of this many elements, may be repeated')
+    parser.add_argument('-k', '--workers', default=None,
+        help='comma-separated worker counts; 1 is always run, as the '
+             'baseline of the efficiency (default: 1, 2, 4, ... up to the '
+             'number of cores)')
+    parser.add_argument('--duration', type=float, default=2.,
+        help='seconds every worker runs the cell (default 2)')
+    parser.add_argument('-o', '--output', default='openmp_throughput.csv')
+    args = parser.parse_args()
+
+    ks = sorted(set([int(k) for k in args.workers.split(',')] + [1])) \
+        if args.workers else counts(len(sweep.available_cores()))
+    cells = []
+    for suite in args.suite or ['simple']:
+        s = op_eval.suites[suite]()
+        cells += [(suite, i, j)
+            for i, r in enumerate(s.rows) if op_eval.selected(r, args.op)
+            for j, sz in enumerate(s.sizes)
+            if not args.size or int(np.prod(sz)) in args.size]
+    write_table(args.output, throughput(cells, ks, args.duration))